@@ -25,8 +25,12 @@ an "@"). This makes every bulk shape natural, e.g.:
   addusertoSpace.py alice@x.com bob@x.com <space_id_1> <space_id_2>   # 2 users into 2 spaces
   Get-Content emails.txt | python addusertoSpace.py --stdin <space_id>   # many users, one space
   Get-Content space_ids.txt | python addusertoSpace.py --stdin alice@x.com   # one user, many spaces
+  python user_spaces.py --jsonl alice@x.com | python addusertoSpace.py --stdin bob@x.com
+A piped JSONL record stands for its roomId if it has one (so a membership names its space),
+else a person record for its email.
 
 Usage: addusertoSpace.py [--stdin] <email|space_id> [<email|space_id> ...]
+       addusertoSpace.py --resume <journal>
 
 The tool assumes your token is entitled to add members to each space. That is not always true --
 a space may be moderated by someone else, in which case only its moderators can add members and
@@ -34,6 +38,10 @@ the API returns 403 Forbidden. Each add is attempted independently; failures (a
 a bad email, any API error) are reported and the run continues. Exits non-zero if ANY add failed,
 so bulk callers can detect problems.
 
+Every add is planned up front in a journal file (named in the output) and marked off as it
+completes. If a run is cut short -- an expired token, Ctrl-C -- or some adds failed, re-run with
+--resume <journal> to carry on with only the adds that have not yet succeeded.
+
 Requires an auth token from a user with admin privileges against the Webex Control Hub org.
 """
 
@@ -42,17 +50,24 @@ import re
 import sys
 
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+
+from wxcommon import (OperationJournal, journal_path, parse_record, record_target, run_journal,
+                      run_main, webex_api)
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
 # i.e. c:\users\jsmith\Personal-Local\config.yml
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.yml")
 
+TOOL = 'addusertoSpace'
+
 USAGE = ('Usage: addusertoSpace.py [--stdin] <email|space_id> [<email|space_id> ...]\n'
+         '       addusertoSpace.py --resume <journal>\n'
          '  Tokens are sorted into emails (contain @) and space ids; every email is added to '
          'every space.\n'
-         '  --stdin (or -) also reads tokens from stdin, one per line (blank lines ignored).')
+         '  --stdin (or -) also reads tokens from stdin, one per line (blank lines ignored);\n'
+         '    JSONL records from other tools\' --jsonl output are accepted too.\n'
+         '  --resume <journal> finishes the outstanding adds of an earlier run.')
 
 def valid_smtp(email):
     """check if email is valid URI syntax"""
@@ -63,17 +78,51 @@ def valid_smtp(email):
     return True
 
 def collect_tokens():
-    """gather tokens from argv (and stdin if requested); return the raw token list"""
+    """gather tokens from argv (and stdin if requested); return (token list, resume journal)"""
     read_stdin = False
+    resume_path = None
     tokens = []
-    for arg in sys.argv[1:]:
+    args = iter(sys.argv[1:])
+    for arg in args:
         if arg in ('--stdin', '-'):
             read_stdin = True
+        elif arg == '--resume':
+            resume_path = next(args, None)
+            if not resume_path:
+                print(USAGE)
+                sys.exit(1)
         else:
             tokens.append(arg)
     if read_stdin:
-        tokens.extend(line.strip() for line in sys.stdin if line.strip())
-    return tokens
+        for line in sys.stdin:
+            record = parse_record(line)
+            if record is None:
+                if line.strip():
+                    tokens.append(line.strip())
+            else:
+                tokens.append(record_target(record, 'roomId'))
+    return [token for token in tokens if token], resume_path
+
+def add_member(operation, api):
+    """perform one planned add"""
+    api.memberships.create(roomId=operation['roomId'], personEmail=operation['personEmail'],
+                           isModerator=False)
+    print(f'Added {operation["personEmail"]} to space {operation["roomId"]}')
+
+def report_already_member(operation, error):
+    """note an add that found the user already a member"""
+    print(f'{operation["personEmail"]} is already a member of space {operation["roomId"]}')
+
+def report_failure(operation, error):
+    """report an add that failed"""
+    email, space_id = operation['personEmail'], operation['roomId']
+    # a moderated space rejects non-moderators with 403; call that out specifically
+    if error.status_code == 403:
+        print(f'### Not permitted to add {email} to space {space_id}: the space is '
+              'likely moderated by someone else, so only its moderators can add '
+              'members. ###')
+    else:
+        print(f'### Failed to add {email} to space {space_id}: {error} ###')
 
 def main():
     """add every supplied user (by email) to every supplied space; inputs via args and/or stdin"""
@@ -86,50 +135,53 @@ def main():
         except (AttributeError, ValueError):
             pass
 
-    tokens = collect_tokens()
-    # a token with "@" is an email; anything else is a base64 space id (ids never contain "@")
-    emails = [tok for tok in tokens if '@' in tok]
-    space_ids = [tok for tok in tokens if '@' not in tok]
-
+    tokens, resume_path = collect_tokens()
     any_failure = False
-    valid_emails = []
-    for email in emails:
-        if valid_smtp(email):
-            valid_emails.append(email)
-        else:
-            any_failure = True  # valid_smtp already reported the bad address
 
-    if not valid_emails or not space_ids:
-        print(USAGE)
-        sys.exit(1)
+    if resume_path:
+        # the journal already holds the planned adds; any tokens given alongside are ignored
+        try:
+            journal = OperationJournal.load(resume_path, TOOL)
+        except (OSError, ValueError) as error:
+            print(f'### Could not resume from journal: {error} ###')
+            sys.exit(1)
+    else:
+        # a token with "@" is an email; anything else is a base64 space id (ids never contain "@")
+        emails = [tok for tok in tokens if '@' in tok]
+        space_ids = [tok for tok in tokens if '@' not in tok]
+
+        valid_emails = []
+        for email in emails:
+            if valid_smtp(email):
+                valid_emails.append(email)
+            else:
+                any_failure = True  # valid_smtp already reported the bad address
+
+        if not valid_emails or not space_ids:
+            print(USAGE)
+            sys.exit(1)
+
+        # add every email to every space (cartesian product); each add is attempted independently
+        operations = [{'roomId': space_id, 'personEmail': email}
+                      for space_id in space_ids for email in valid_emails]
 
     with open(CONFIG_FILE, 'r') as config_file:
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
-
-    # add every email to every space (cartesian product); attempt each independently
-    for space_id in space_ids:
-        for email in valid_emails:
-            try:
-                api.memberships.create(roomId=space_id, personEmail=email, isModerator=False)
-                print(f'Added {email} to space {space_id}')
-            except ApiError as error:
-                any_failure = True
-                # a moderated space rejects non-moderators with 403; call that out specifically
-                if error.status_code == 403:
-                    print(f'### Not permitted to add {email} to space {space_id}: the space is '
-                          'likely moderated by someone else, so only its moderators can add '
-                          'members. ###')
-                else:
-                    print(f'### Failed to add {email} to space {space_id}: {error} ###')
+    api = webex_api(CONFIG_FILE, wxteams_config)
+
+    if not resume_path:
+        journal = OperationJournal.create(journal_path(TOOL), TOOL, operations)
+    # 409: already a member
+    if run_journal(journal, lambda operation: add_member(operation, api), report_failure, 409,
+                   report_already_member):
+        any_failure = True
 
     if any_failure:
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
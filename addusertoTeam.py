@@ -25,13 +25,20 @@ an "@"). This makes every bulk shape natural, e.g.:
   addusertoTeam.py alice@x.com bob@x.com <team_id_1> <team_id_2>   # 2 users into 2 teams
   Get-Content emails.txt | python addusertoTeam.py --stdin <team_id>   # many users, one team
   Get-Content team_ids.txt | python addusertoTeam.py --stdin alice@x.com   # one user, many teams
+A piped JSONL record stands for its teamId if it has one (so a room listing entry names its
+team), else a person record for its email.
 
 Usage: addusertoTeam.py [--stdin] <email|team_id> [<email|team_id> ...]
+       addusertoTeam.py --resume <journal>
 
 Each add is attempted independently; failures (a bad email, insufficient rights on the team, any
 API error) are reported and the run continues. Exits non-zero if ANY add failed, so bulk callers
 can detect problems.
 
+Every add is planned up front in a journal file (named in the output) and marked off as it
+completes. If a run is cut short -- an expired token, Ctrl-C -- or some adds failed, re-run with
+--resume <journal> to carry on with only the adds that have not yet succeeded.
+
 Requires an auth token from a user with admin privileges against the Webex Control Hub org.
 """
 
@@ -40,17 +47,24 @@ import re
 import sys
 
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+
+from wxcommon import (OperationJournal, journal_path, parse_record, record_target, run_journal,
+                      run_main, webex_api)
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
 # i.e. c:\users\jsmith\Personal-Local\config.yml
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.yml")
 
+TOOL = 'addusertoTeam'
+
 USAGE = ('Usage: addusertoTeam.py [--stdin] <email|team_id> [<email|team_id> ...]\n'
+         '       addusertoTeam.py --resume <journal>\n'
          '  Tokens are sorted into emails (contain @) and team ids; every email is added to '
          'every team.\n'
-         '  --stdin (or -) also reads tokens from stdin, one per line (blank lines ignored).')
+         '  --stdin (or -) also reads tokens from stdin, one per line (blank lines ignored);\n'
+         '    JSONL records from other tools\' --jsonl output are accepted too.\n'
+         '  --resume <journal> finishes the outstanding adds of an earlier run.')
 
 def valid_smtp(email):
     """check if email is valid URI syntax"""
@@ -61,17 +75,50 @@ def valid_smtp(email):
     return True
 
 def collect_tokens():
-    """gather tokens from argv (and stdin if requested); return the raw token list"""
+    """gather tokens from argv (and stdin if requested); return (token list, resume journal)"""
     read_stdin = False
+    resume_path = None
     tokens = []
-    for arg in sys.argv[1:]:
+    args = iter(sys.argv[1:])
+    for arg in args:
         if arg in ('--stdin', '-'):
             read_stdin = True
+        elif arg == '--resume':
+            resume_path = next(args, None)
+            if not resume_path:
+                print(USAGE)
+                sys.exit(1)
         else:
             tokens.append(arg)
     if read_stdin:
-        tokens.extend(line.strip() for line in sys.stdin if line.strip())
-    return tokens
+        for line in sys.stdin:
+            record = parse_record(line)
+            if record is None:
+                if line.strip():
+                    tokens.append(line.strip())
+            else:
+                tokens.append(record_target(record, 'teamId'))
+    return [token for token in tokens if token], resume_path
+
+def add_member(operation, api):
+    """perform one planned add"""
+    api.team_memberships.create(teamId=operation['teamId'], personEmail=operation['personEmail'],
+                                isModerator=False)
+    print(f'Added {operation["personEmail"]} to team {operation["teamId"]}')
+
+def report_already_member(operation, error):
+    """note an add that found the user already a member"""
+    print(f'{operation["personEmail"]} is already a member of team {operation["teamId"]}')
+
+def report_failure(operation, error):
+    """report an add that failed"""
+    email, team_id = operation['personEmail'], operation['teamId']
+    # 403 usually means you lack moderator/admin rights on the team
+    if error.status_code == 403:
+        print(f'### Not permitted to add {email} to team {team_id}: you may lack '
+              'moderator/admin rights on that team. ###')
+    else:
+        print(f'### Failed to add {email} to team {team_id}: {error} ###')
 
 def main():
     """add every supplied user (by email) to every supplied team; inputs via args and/or stdin"""
@@ -84,49 +131,53 @@ def main():
         except (AttributeError, ValueError):
             pass
 
-    tokens = collect_tokens()
-    # a token with "@" is an email; anything else is a base64 team id (ids never contain "@")
-    emails = [tok for tok in tokens if '@' in tok]
-    team_ids = [tok for tok in tokens if '@' not in tok]
-
+    tokens, resume_path = collect_tokens()
     any_failure = False
-    valid_emails = []
-    for email in emails:
-        if valid_smtp(email):
-            valid_emails.append(email)
-        else:
-            any_failure = True  # valid_smtp already reported the bad address
 
-    if not valid_emails or not team_ids:
-        print(USAGE)
-        sys.exit(1)
+    if resume_path:
+        # the journal already holds the planned adds; any tokens given alongside are ignored
+        try:
+            journal = OperationJournal.load(resume_path, TOOL)
+        except (OSError, ValueError) as error:
+            print(f'### Could not resume from journal: {error} ###')
+            sys.exit(1)
+    else:
+        # a token with "@" is an email; anything else is a base64 team id (ids never contain "@")
+        emails = [tok for tok in tokens if '@' in tok]
+        team_ids = [tok for tok in tokens if '@' not in tok]
+
+        valid_emails = []
+        for email in emails:
+            if valid_smtp(email):
+                valid_emails.append(email)
+            else:
+                any_failure = True  # valid_smtp already reported the bad address
+
+        if not valid_emails or not team_ids:
+            print(USAGE)
+            sys.exit(1)
+
+        # add every email to every team (cartesian product); each add is attempted independently
+        operations = [{'teamId': team_id, 'personEmail': email}
+                      for team_id in team_ids for email in valid_emails]
 
     with open(CONFIG_FILE, 'r') as config_file:
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
-
-    # add every email to every team (cartesian product); attempt each independently
-    for team_id in team_ids:
-        for email in valid_emails:
-            try:
-                api.team_memberships.create(teamId=team_id, personEmail=email, isModerator=False)
-                print(f'Added {email} to team {team_id}')
-            except ApiError as error:
-                any_failure = True
-                # 403 usually means you lack moderator/admin rights on the team
-                if error.status_code == 403:
-                    print(f'### Not permitted to add {email} to team {team_id}: you may lack '
-                          'moderator/admin rights on that team. ###')
-                else:
-                    print(f'### Failed to add {email} to team {team_id}: {error} ###')
+    api = webex_api(CONFIG_FILE, wxteams_config)
+
+    if not resume_path:
+        journal = OperationJournal.create(journal_path(TOOL), TOOL, operations)
+    # 409: already a member
+    if run_journal(journal, lambda operation: add_member(operation, api), report_failure, 409,
+                   report_already_member):
+        any_failure = True
 
     if any_failure:
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -0,0 +1,179 @@
+# Copyright (C) 2020 Frederick W. Nielsen
+#
+# This file is part of Cisco Collaboration Cloud Tools.
+#
+# Cisco Collaboration Cloud Tools is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Cisco Collaboration Cloud Tools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Cisco Collaboration Cloud Tools.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks the ways a streamed HTTP download can be copied to disk, to pick the buffer size
+and write path used by dl_recordings.py and user_picgrabber.py.
+
+Usage: bench_download.py [--size GB] [--runs N] [--dir DIR] [--hash]
+  --size  size of the file served, in GB (default: 2)
+  --runs  downloads per method; the best run is reported (default: 3)
+  --dir   where the downloaded copies are written (and removed again) -- put it on the disk
+          the recordings go to (default: the system temporary directory)
+  --hash  also SHA-256 each buffer, as dl_recordings.py does
+
+A local HTTP server, in a process of its own so its CPU time isn't counted, serves the file
+from a repeated block of random bytes -- nothing is read from disk. Each method downloads it
+through a requests session and writes it to a file, and its wall-clock throughput and the CPU
+seconds the download used per GB are printed:
+  iter_content  response.iter_content(chunk_size), as the tools did -- a new bytes object per
+                chunk, each written on its own
+  readinto      response.raw.readinto() into one preallocated bytearray reused for the whole
+                file, written out through a memoryview
+
+Measured on a 1 GB file, chunk size is what matters: 8 KB chunks ran at about a third of the
+throughput of 256 KB ones, for three times the CPU, with little gained past 256 KB. readinto
+was no faster than iter_content at the same size -- urllib3 reads each piece into a bytes
+object of its own before copying it into the buffer -- so both tools use iter_content with a
+256 KB chunk.
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from wxcommon import run_main
+
+# the block the served file is built from, and the buffer sizes tried for each method
+BLOCK = os.urandom(1048576)
+CHUNK_SIZES = (1024, 8192, 65536, 262144, 1048576, 4194304)
+READINTO_SIZES = (65536, 262144, 1048576, 4194304)
+
+class FileHandler(BaseHTTPRequestHandler):
+    """serves size bytes, built from BLOCK, for any GET"""
+    size = 0
+
+    def do_GET(self):
+        """send the whole file in BLOCK-sized writes"""
+        self.send_response(200)
+        self.send_header('Content-Length', str(self.size))
+        self.end_headers()
+        view = memoryview(BLOCK)
+        remaining = self.size
+        while remaining:
+            sent = min(remaining, len(BLOCK))
+            self.wfile.write(view[:sent])
+            remaining -= sent
+
+    def log_message(self, *args):
+        """keep the server quiet"""
+
+def serve(size, ready):
+    """run the benchmark server on a free local port, reporting the port through ready"""
+    FileHandler.size = size
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+def iter_content_copy(response, file, size, digest):
+    """copy with iter_content, one new bytes object per chunk; returns bytes written"""
+    written = 0
+    for chunk in response.iter_content(chunk_size=size):
+        file.write(chunk)
+        if digest:
+            digest.update(chunk)
+        written += len(chunk)
+    return written
+
+def readinto_copy(response, file, size, digest):
+    """copy with raw.readinto through one reused buffer; returns bytes written"""
+    # requests leaves gzip/deflate decoding to iter_content; reading the raw stream must ask
+    response.raw.decode_content = True
+    view = memoryview(bytearray(size))
+    written = 0
+    while True:
+        count = response.raw.readinto(view)
+        if not count:
+            return written
+        file.write(view[:count])
+        if digest:
+            digest.update(view[:count])
+        written += count
+
+def timed_download(url, path, method, size, hash_data):
+    """download url to path once with a method; return (seconds, CPU seconds, bytes)"""
+    digest = hashlib.sha256() if hash_data else None
+    with requests.Session() as session:
+        wall, cpu = time.perf_counter(), time.process_time()
+        with session.get(url, stream=True) as response, open(path, 'wb') as file:
+            response.raise_for_status()
+            written = method(response, file, size, digest)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    os.remove(path)
+    return wall, cpu, written
+
+def main():
+    """times each download method and buffer size against a local server"""
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.reconfigure(encoding='utf-8')
+        except (AttributeError, ValueError):
+            pass
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark streamed download buffer sizes and write paths.')
+    parser.add_argument('--size', type=float, default=2,
+                        help='size of the file served, in GB (default: %(default)s)')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='downloads per method, best reported (default: %(default)s)')
+    parser.add_argument('--dir', default=tempfile.gettempdir(),
+                        help='directory the downloads are written to (default: %(default)s)')
+    parser.add_argument('--hash', action='store_true',
+                        help='SHA-256 the data as it is written, as dl_recordings.py does')
+    args = parser.parse_args()
+
+    size = int(args.size * 1073741824)
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(size, ready), daemon=True)
+    server.start()
+    url = f'http://127.0.0.1:{ready.get()}/file'
+    path = os.path.join(args.dir, f'bench_download.{os.getpid()}.tmp')
+
+    methods = ([(f'iter_content {chunk:>8}', iter_content_copy, chunk)
+                for chunk in CHUNK_SIZES] +
+               [(f'readinto     {chunk:>8}', readinto_copy, chunk)
+                for chunk in READINTO_SIZES])
+    print(f'{size / 1073741824:.1f} GB file, best of {args.runs} run(s)'
+          + (', hashing' if args.hash else '') + f', written to {args.dir}\n')
+    print(f'{"method       buffer":<24}{"MB/s":>10}{"CPU s/GB":>10}')
+    results = list()
+    try:
+        for label, method, chunk in methods:
+            runs = list()
+            for _ in range(args.runs):
+                wall, cpu, written = timed_download(url, path, method, chunk, args.hash)
+                if written != size:
+                    print(f'### {label.strip()} wrote {written} of {size} bytes')
+                runs.append((wall, cpu))
+            wall, cpu = min(runs)
+            results.append((wall, label))
+            print(f'{label:<24}{size / 1048576 / wall:>10.0f}'
+                  f'{cpu / (size / 1073741824):>10.2f}', flush=True)
+    finally:
+        server.terminate()
+        if os.path.exists(path):
+            os.remove(path)
+    print(f'\nFastest: {min(results)[1].split()[0]}, {min(results)[1].split()[1]} byte buffer')
+
+if __name__ == "__main__":
+    run_main(main)
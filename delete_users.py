@@ -16,15 +16,24 @@
 
 """
 Lists and mass deletes users in a Control Hub org.  DANGER!
+
+Usage: delete_users.py [--resume <journal>]
+
+The deletions are written to a journal file (named in the output) before the first is sent, and
+each is marked off as it completes. If a run is cut short, --resume <journal> carries on with the
+deletions still outstanding, without listing the org again.
 """
 
 import itertools
 import os
 import shutil
 import sys
+from collections import namedtuple
 
 import yaml
-from webexpythonsdk import WebexAPI
+
+from wxcommon import (OperationJournal, journal_path, list_json, resume_argument, run_journal,
+                      run_main, webex_api)
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -35,10 +44,16 @@ CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.ym
 USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
               ' (KHTML, like Gecko) Chrome/74.0.3729.169 Safari/537.36')
 
+TOOL = 'delete_users'
+USAGE = 'Usage: delete_users.py [--resume <journal>]'
+
 SPINNER = itertools.cycle(['-', '/', '|', '\\'])
 PAGE_SIZE = 500
 SLEEPER = 3
 
+# the few fields kept per user -- a tuple rather than the full person payload, for big orgs
+OrgUser = namedtuple('OrgUser', ['id', 'name', 'created', 'modified', 'email'])
+
 # specify users to NOT delete by base64 userid or email address
 SKIP_USERS = ({
     'id': (
@@ -68,12 +83,21 @@ def print_done():
     print(' done.\n\n')
 
 def user_attribs(user):
-    """repeatable user object parsing"""
-    return ({'id': user.id,
-             'name': user.displayName,
-             'created':user.created,
-             'modified':user.lastModified,
-             'email':user.emails[0]})
+    """repeatable user JSON parsing"""
+    return OrgUser(user['id'],
+                   user.get('displayName'),
+                   user.get('created'),
+                   user.get('lastModified'),
+                   user['emails'][0])
+
+def delete_user(user, api):
+    """perform one planned deletion"""
+    print_status(f'Deleting user: {user["name"]}')
+    api.people.delete(personId=user['id'])
+
+def report_failure(user, error):
+    """report a deletion that failed"""
+    print(f'\n### Failed to delete {user["name"]}: {error}')
 
 def main():
     """finds all in an org and lets you select which to delete"""
@@ -86,16 +110,29 @@ def main():
         except (AttributeError, ValueError):
             pass
 
+    resume_path = resume_argument(USAGE)
+
     with open(CONFIG_FILE, 'r') as config_file:
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
     # optional: query a specific org by id, only applied when set in config.yml
     org_id = wxteams_config.get('org_id')
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
+
+    if resume_path:
+        try:
+            journal = OperationJournal.load(resume_path, TOOL)
+        except (OSError, ValueError) as error:
+            print(f'### Could not resume from journal: {error}')
+            sys.exit(1)
+        print(f'\nDeletions outstanding in {resume_path}: {len(journal.pending())}\n')
+        if not input("#DANGER# Continue? (y/n): ").lower().strip()[:1] == "y":
+            exit()
+        run_journal(journal, lambda user: delete_user(user, api), report_failure, 404)
+        return
 
     user_list = list()
     delete_list = list()
@@ -106,8 +143,9 @@ def main():
         print_status('Querying user list, please wait...')
 
         for email in SPECIFIC_USERS:
-            for user in api.people.list(email=email):
-                print_status(f'Grabbing user #{count} of {len(SPECIFIC_USERS)}: {user.displayName}')
+            for user in list_json(api, 'people', email=email):
+                print_status(f'Grabbing user #{count} of {len(SPECIFIC_USERS)}: '
+                             f'{user.get("displayName")}')
                 user_list.append(user_attribs(user))
             count += 1
 
@@ -118,8 +156,8 @@ def main():
         people_query = {'max': PAGE_SIZE}
         if org_id:
             people_query['orgId'] = org_id
-        for user in api.people.list(**people_query):
-            print_status(f'Grabbing list of users #{count}: {user.displayName}')
+        for user in list_json(api, 'people', **people_query):
+            print_status(f'Grabbing list of users #{count}: {user.get("displayName")}')
             user_list.append(user_attribs(user))
             count += 1
 
@@ -128,10 +166,10 @@ def main():
     print(f'Total users: {len(user_list)}\n')
 
     for user in user_list:
-        if user['id'] in SKIP_USERS['id'] or user['email'] in SKIP_USERS['email']:
-            print(f'Skipping: {user["name"]}')
+        if user.id in SKIP_USERS['id'] or user.email in SKIP_USERS['email']:
+            print(f'Skipping: {user.name}')
         else:
-            delete_list.append({'id': user['id'], 'name': user['name']})
+            delete_list.append({'id': user.id, 'name': user.name})
 
     print(f'\nTotal deletions to process: {len(delete_list)}\n')
 
@@ -139,14 +177,8 @@ def main():
         exit()
 
     print('Continued!')
-    count = 1
-    for user in delete_list:
-        print_status(f'Deleting users #{count}: {user["name"]}')
-        api.people.delete(personId=user['id'])
-
-        count += 1
-
-
+    journal = OperationJournal.create(journal_path(TOOL), TOOL, delete_list)
+    run_journal(journal, lambda user: delete_user(user, api), report_failure, 404)
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -32,13 +32,16 @@ Devices can be scoped by software channel (--channel stable/beta/...), device ty
 default roomdesk), product (--product, wildcards allowed) and/or display name (--name).
 By default only devices with crash evidence (an abnormal shutdown or active error-level
 diagnostics) are output; use --all to include every device scanned. Offline devices cannot
-answer xAPI queries and are reported to stderr as skipped.
+answer xAPI queries and are reported to stderr as skipped. --jsonl writes each reported
+device to stdout as a JSON record (its id plus the CSV columns) as soon as it is scanned,
+instead of CSV at the end.
 
 Usage examples:
   device_crashscan.py                                  scan all roomdesk devices
   device_crashscan.py --channel beta                   only devices on the beta channel
   device_crashscan.py --product "*Desk*" --all         all Desk devices, crashed or not
   device_crashscan.py --name "Lobby*" -o crashes.csv   name-filtered, written to a file
+  device_crashscan.py --all --jsonl                    every device, one JSON record per line
 
 Requires an auth token with the spark:xapi_statuses scope (not included in spark:all --
 it must be added to the integration explicitly) plus admin device access
@@ -50,19 +53,18 @@ import csv
 import fnmatch
 import os
 import sys
-from time import sleep
 
-import requests
 import yaml
+from webexpythonsdk import ApiError
+
+from wxcommon import emit_record, list_json, run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
 # i.e. c:\users\jsmith\Personal-Local\config.yml
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.yml")
 
-BASE_URL = 'https://webexapis.com/v1'
 PAGE = 100
-TIMEOUT = 30
 
 # LastShutdownReason values that indicate a clean, explained shutdown; anything else
 # (notably "Unknown") means the device went down unexpectedly
@@ -73,42 +75,16 @@ CSV_HEADER = ['displayName', 'product', 'type', 'software', 'upgradeChannel',
               'connectionStatus', 'abnormalShutdown', 'lastShutdownReason',
               'lastShutdownTime', 'uptimeDays', 'diagnostics', 'errorCodes']
 
-def api_get(session, url, params=None):
-    """GET against the API, retrying on rate limiting (honoring Retry-After)"""
-    while True:
-        response = session.get(url, params=params, timeout=TIMEOUT)
-        if response.status_code == 429:
-            try:
-                wait = max(int(response.headers.get('Retry-After', 1)), 1)
-            except ValueError:
-                wait = 1
-            print(f'server busy, retrying in {wait}s...', file=sys.stderr)
-            sleep(wait)
-            continue
-        return response
-
-def list_devices(session, device_type):
-    """list org devices (optionally server-side filtered by type), following pagination"""
-    devices = []
+def list_devices(api, device_type):
+    """list org devices (optionally server-side filtered by type)"""
     params = {'max': PAGE}
     if device_type and device_type.lower() != 'any':
         params['type'] = device_type
-    start = 0
-    while True:
-        params['start'] = start
-        response = api_get(session, f'{BASE_URL}/devices', params)
-        if response.status_code != 200:
-            print(f'### Device list failed: {response.status_code}: '
-                  f'{response.content.decode("utf-8")}', file=sys.stderr)
-            raise SystemExit(1)
-        items = response.json().get('items', [])
-        if not items:
-            break
-        devices.extend(items)
-        if len(items) < PAGE:
-            break
-        start += len(items)
-    return devices
+    try:
+        return list(list_json(api, 'devices', **params))
+    except ApiError as error:
+        print(f'### Device list failed: {error}', file=sys.stderr)
+        raise SystemExit(1)
 
 def name_match(value, pattern):
     """case-insensitive match: wildcard pattern if it contains */?, else substring"""
@@ -128,17 +104,19 @@ def matches_filters(device, args):
         return False
     return True
 
-def xapi_status(session, device_id, name):
+def xapi_status(api, device_id, name):
     """query a device xStatus path via the cloud xAPI; returns the result dict or None"""
-    response = api_get(session, f'{BASE_URL}/xapi/status',
-                       {'deviceId': device_id, 'name': name})
-    if response.status_code != 200:
+    # the SDK has no xAPI wrapper, so the call goes straight through its session -- still
+    # with its rate-limit (429) retries and the token refresh webex_api adds
+    try:
+        response = api._session.get('xapi/status', params={'deviceId': device_id, 'name': name})
+    except ApiError:
         return None
-    return response.json().get('result', {})
+    return response.get('result', {})
 
-def scan_device(session, device):
+def scan_device(api, device):
     """query one device's crash signals; returns a CSV row dict, or None if unreachable"""
-    system_unit = xapi_status(session, device['id'], 'SystemUnit.*')
+    system_unit = xapi_status(api, device['id'], 'SystemUnit.*')
     if system_unit is None:
         return None
     system_unit = system_unit.get('SystemUnit', {})
@@ -147,7 +125,7 @@ def scan_device(session, device):
     uptime_secs = system_unit.get('Uptime')
 
     # active diagnostics, e.g. [{'id': 1, 'Description': ..., 'Level': ..., 'Type': ...}]
-    diagnostics = (xapi_status(session, device['id'], 'Diagnostics.*') or {})
+    diagnostics = (xapi_status(api, device['id'], 'Diagnostics.*') or {})
     messages = (diagnostics.get('Diagnostics') or {}).get('Message') or []
     diagnostics_text = '; '.join(
         f'{message.get("Level", "?")}: {message.get("Type", "?")}: '
@@ -198,19 +176,23 @@ def main():
     parser.add_argument('--all', action='store_true',
                         help='output every device scanned, not just those with crash evidence')
     parser.add_argument('-o', '--output', help='write CSV to this file (default: stdout)')
+    parser.add_argument('--jsonl', action='store_true',
+                        help='write each device to stdout as a JSON record as it is scanned')
     args = parser.parse_args()
+    if args.jsonl and args.output:
+        parser.error('--jsonl writes to stdout; it cannot be combined with -o/--output')
 
     with open(CONFIG_FILE, 'r') as config_file:
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
-    session = requests.Session()
-    session.headers.update({"Authorization": f"Bearer {wxteams_token}"})
+    # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work,
+    # including pagination and rate-limit (429) retries
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     print('Listing devices...', file=sys.stderr)
-    devices = list_devices(session, args.type)
+    devices = list_devices(api, args.type)
     matched = [device for device in devices if matches_filters(device, args)]
     print(f'{len(matched)} of {len(devices)} device(s) match the filter.', file=sys.stderr)
 
@@ -225,26 +207,29 @@ def main():
     for count, device in enumerate(online, 1):
         print(f'  [{count}/{len(online)}] scanning {device.get("displayName", device["id"])}...',
               file=sys.stderr)
-        row = scan_device(session, device)
+        row = scan_device(api, device)
         if row is None:
             print(f'### could not query {device.get("displayName", device["id"])}, skipping '
                   '(check the token has the spark:xapi_statuses scope)', file=sys.stderr)
             continue
         if args.all or row['_crash_evidence']:
             rows.append(row)
+            if args.jsonl:
+                emit_record({'id': device['id'], **{field: row[field] for field in CSV_HEADER}})
 
-    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
-    try:
-        writer = csv.DictWriter(out, fieldnames=CSV_HEADER, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(rows)
-    finally:
-        if args.output:
-            out.close()
+    if not args.jsonl:
+        out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+        try:
+            writer = csv.DictWriter(out, fieldnames=CSV_HEADER, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        finally:
+            if args.output:
+                out.close()
 
     flagged = sum(1 for row in rows if row['_crash_evidence'])
     print(f'\n{flagged} device(s) with crash evidence '
           f'({len(rows)} row(s) written).', file=sys.stderr)
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
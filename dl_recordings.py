@@ -17,18 +17,71 @@
 """
 Mass-downloads all recordings and transcripts for one or more host users, prompting for how
 many days back to search. Requires admin scope to access recordings other than your own.
+
+Usage: dl_recordings.py [--days N] [--org [--index FILE] [--list-only] | --from-index FILE]
+                        [--sync] [--max-rate RATE] [--order listed|smallest|oldest]
+                        [<host_email> ...]
+  Run with no arguments to be prompted for the hosts and the number of days.
+  --org         list every recording in the org through the admin recordings listing -- one
+                query chain per 30-day window, rather than one per host per window -- keeping
+                only the given hosts' (if any), write the compact index (id, host, topic, size,
+                created) to --index, then download from it. Needs an admin or Compliance
+                Officer token with recordings read scope.
+  --list-only   with --org, write the index and stop.
+  --from-index  download the recordings in an index written by an earlier --org run -- only
+                the given hosts', if any.
+  --max-rate    cap the combined download rate, in bytes a second (K, M and G suffixes allowed,
+                e.g. 20M), so a run on a shared host leaves the rest of the uplink free.
+  --sync        unattended incremental run, e.g. daily from a scheduler: each host (or, with
+                --org and no hosts, the whole org) is only listed from its last successful sync,
+                less SYNC_OVERLAP, as kept in SYNC_FILE -- usually a single listing window --
+                and files are filed under <host>/<year>/<month>. A host new to SYNC_FILE is
+                listed --days back. A host whose listing, lookups or downloads failed keeps its
+                old sync time, so the next run tries its recordings again.
+  --order       download order: as listed (the default, which starts downloading while listing
+                is still under way), smallest-first for quick progress, or oldest-first. Either
+                of the last two lists everything before the first download.
+
+Before a recording is queued, its reported size is checked against the disk space free when the
+run started (less DISK_HEADROOM and everything already queued); a recording that won't fit is
+left out and reported, so a run never fails halfway with the disk full.
+
+Every host's recording listings (one per 30-day window) and the recordings' details are fetched
+METADATA_WORKERS at a time, each recording passed on as soon as it is listed, and media files
+are downloaded TRANSFER_WORKERS at a time, with one status line totalling every transfer in
+flight. Details are only fetched a little ahead of the downloads, since their download links are
+short-lived.
+
+Each file is downloaded to "<name>.part" and only renamed once it holds every byte the server
+reported, then recorded -- with its size and SHA-256 -- in MANIFEST_FILE in the working
+directory, alongside the names planned for each recording. Re-running in the same directory
+skips recordings whose files are all recorded and still present at that size, without so much
+as fetching their details, and an interrupted download picks up where its .part file ends
+(via an HTTP Range request) under the name planned for it the first time. A file of at least
+SEGMENT_THRESHOLD bytes is fetched as SEGMENTS byte ranges at once, since a single stream from
+the download servers falls well short of the link's bandwidth; its ranges resume the same way.
 """
 
+import argparse
+import hashlib
 import itertools
+import json
 import os
 import re
 import shutil
 import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
+from functools import partial
 
 import requests
 import yaml
-from webexpythonsdk import ApiError, WebexAPI
+from webexpythonsdk import ApiError
+
+from wxcommon import concurrent_map, list_json, run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -48,6 +101,53 @@ PAGE = 100
 WINDOW_DAYS = 30
 DEFAULT_DAYS_BACK = 365
 
+# recording detail lookups and media downloads kept in flight at once; the two are limited
+# separately since API calls are rate limited and media transfers are bandwidth bound
+METADATA_WORKERS = 4
+TRANSFER_WORKERS = 3
+
+# bytes read from a media stream at a time; 8 KB chunks cost about three times the CPU and
+# capped throughput well below a fast link's (see bench_download.py)
+CHUNK_SIZE = 262144
+
+# a file at least this big, from a server that honours Range requests, is fetched as SEGMENTS
+# byte ranges in parallel (each transfer's ranges on threads of its own); every range checkpoints
+# its progress each SEGMENT_CHECKPOINT bytes so an interrupted download can be resumed
+SEGMENT_THRESHOLD = 256 * 1048576
+SEGMENTS = 4
+SEGMENT_CHECKPOINT = 16 * 1048576
+
+# the record of planned and completed files kept in the download directory across runs
+MANIFEST_FILE = 'dl_recordings.manifest.jsonl'
+
+# where --org writes its recording index, and the fields kept per recording
+INDEX_FILE = 'dl_recordings.index.jsonl'
+INDEX_FIELDS = ('id', 'hostEmail', 'topic', 'sizeBytes', 'createTime')
+
+# --sync: the last successful sync per host, kept in the download directory, and how far before
+# it to list again (recordings can take a while to appear after a meeting ends); ORG_KEY stands
+# for the whole org when --org is synced without hosts
+SYNC_FILE = 'dl_recordings.sync.json'
+SYNC_OVERLAP = timedelta(days=2)
+ORG_KEY = '*'
+
+# set when a run is stopping (Ctrl-C or an error), so transfers under way give up at their next
+# chunk -- leaving their .part files to resume -- instead of holding the exit until they finish
+STOPPING = threading.Event()
+
+# seconds between redraws of the combined progress line
+PROGRESS_INTERVAL = 0.5
+
+# disk space always left free, over and above the recordings queued for download
+DISK_HEADROOM = 512 * 1048576
+
+# download order policies: recording JSON -> sort key (None keeps listing order)
+ORDERS = {'listed': None,
+          'smallest': lambda recording: recording.get('sizeBytes') or 0,
+          'oldest': lambda recording: recording.get('createTime') or ''}
+
+RATE_UNITS = {'': 1, 'K': 1024, 'M': 1048576, 'G': 1073741824}
+
 def print_status(text, linefeed=0):
     """output status line"""
     text = f'{next(SPINNER)} {text}'
@@ -58,53 +158,550 @@ def print_status(text, linefeed=0):
           '\n' * linefeed,
           end='')
 
-def sdk_list_recordings(api, params):
-    """list recordings through the SDK session, yielding Recording objects
+def transfer_rate(text):
+    """parse a --max-rate value such as 500K or 20M into bytes a second"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([KMG]?)B?', text.strip().upper())
+    if not match or float(match.group(1)) <= 0:
+        raise argparse.ArgumentTypeError(f'not a transfer rate: {text}')
+    return int(float(match.group(1)) * RATE_UNITS[match.group(2)])
 
-    Works around a webexpythonsdk bug (still present in 2.0.6): recordings.list()
-    rejects any call that omits integrationTag (check_type missing optional=True) and
-    sends max as a bogus max_recordings query param. This does exactly what that method
-    does after its argument handling, so the SDK session still provides pagination and
-    rate-limit (429) retries.
+class TokenBucket:
+    """a byte budget shared by every transfer thread, refilled at rate bytes a second
+
+    take(count) spends count bytes, then sleeps off any overdraft, so the threads between them
+    never average more than rate; up to a second's worth unused can be spent in a burst.
     """
-    for item in api._session.get_items('recordings', params=params):
-        yield api._object_factory('recording', item)
 
-def list_recordings(api, user, days_back):
-    """return all recordings for a host over the range, or None on an API error
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, count):
+        """spend count bytes of the budget, waiting until the budget covers them"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            self._tokens -= count
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+class Progress:
+    """running totals across every concurrent transfer, drawn on one status line
+
+    Every transfer reports each chunk it receives to advance(), which also holds it to the
+    bandwidth cap when a TokenBucket is given.
+    """
+
+    def __init__(self, bucket=None):
+        self.bucket = bucket
+        self.files = 0
+        self.done = 0
+        self.failed = 0
+        self.received = 0
+        self._drawn = 0.0
+        self._lock = threading.Lock()
+
+    def queued(self):
+        """count a file handed to the transfer pool"""
+        with self._lock:
+            self.files += 1
+            self._draw()
+
+    def advance(self, count):
+        """count bytes received by any transfer, pacing it to the bandwidth cap if there is one"""
+        with self._lock:
+            self.received += count
+            self._draw()
+        if self.bucket:
+            self.bucket.take(count)
+
+    def finished(self, succeeded):
+        """count a transfer that has ended"""
+        with self._lock:
+            if succeeded:
+                self.done += 1
+            else:
+                self.failed += 1
+            self._draw(force=True)
+
+    def _draw(self, force=False):
+        now = time.monotonic()
+        if force or now - self._drawn >= PROGRESS_INTERVAL:
+            self._drawn = now
+            print_status(f'Downloaded {self.done} of {self.files} file(s), '
+                         f'{self.received / 1048576:.1f} MB received...')
+
+class Manifest:
+    """an append-only JSONL record of the files planned and saved for each recording
 
-    Steps back through the range one 30-day window at a time (the API's per-query limit);
-    the SDK follows the pagination links within each window.
+    A {"id", "planned": {ext: name}} line fixes a recording's filenames before its downloads
+    start; an {"id", "file", "size", "sha256"} line records a file once it is saved in full.
+    Each line is flushed to disk as written, and a line torn by a crash is ignored on load.
     """
-    recordings = {}
+
+    def __init__(self, path):
+        self.path = path
+        self.planned = dict()
+        self.files = dict()
+        self._lock = threading.Lock()
+        torn = False
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as manifest_file:
+                for line in manifest_file:
+                    torn = not line.endswith('\n')
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if 'planned' in record:
+                        self.planned.setdefault(record['id'], dict()).update(record['planned'])
+                    elif 'file' in record:
+                        self.files[record['file']] = record
+        self._file = open(path, 'a', encoding='utf-8')
+        if torn:
+            # finish the torn line so the next record starts on a line of its own
+            self._write(None)
+
+    def saved(self, name):
+        """True if a file is recorded as saved and is still there at its recorded size"""
+        entry = self.files.get(name)
+        return entry is not None and os.path.isfile(name) and \
+            os.path.getsize(name) == entry['size']
+
+    def complete(self, recording_id):
+        """True if every file planned for a recording is saved"""
+        names = self.planned.get(recording_id)
+        return bool(names) and all(self.saved(name) for name in names.values())
+
+    def plan(self, recording_id, names):
+        """record the filenames (by extension) a recording's files are downloaded under"""
+        self.planned.setdefault(recording_id, dict()).update(names)
+        self._write({'id': recording_id, 'planned': names})
+
+    def record(self, recording_id, name, size, sha256):
+        """record a file saved in full"""
+        entry = {'id': recording_id, 'file': name, 'size': size, 'sha256': sha256}
+        self.files[name] = entry
+        self._write(entry)
+
+    def close(self):
+        """close the manifest file; a transfer still winding down records nothing more"""
+        with self._lock:
+            self._file.close()
+
+    def _write(self, record):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write('' if record is None else json.dumps(record, ensure_ascii=False))
+            self._file.write('\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+def load_sync_state(path):
+    """return the saved {host: last sync datetime} of a --sync download directory"""
+    try:
+        with open(path, 'r', encoding='utf-8') as sync_file:
+            saved = json.load(sync_file)
+    except FileNotFoundError:
+        return dict()
+    except (OSError, ValueError) as error:
+        print(f'### could not read {path}, syncing from scratch: {error}')
+        return dict()
+    return {host: datetime.fromisoformat(synced) for host, synced in saved.items()}
+
+def save_sync_state(path, state):
+    """atomically write the {host: last sync datetime} of a --sync download directory"""
+    temp = path + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as sync_file:
+        json.dump({host: synced.isoformat() for host, synced in sorted(state.items())},
+                  sync_file, indent=1)
+    os.replace(temp, path)
+
+def listing_windows(oldest):
+    """return (from, to) windows, newest first, covering oldest to now in WINDOW_DAYS spans"""
+    windows = list()
     window_end = datetime.now(timezone.utc)
-    oldest = window_end - timedelta(days=days_back)
     while window_end > oldest:
         window_start = max(window_end - timedelta(days=WINDOW_DAYS), oldest)
-        params = {'max': PAGE,
-                  'hostEmail': user,
-                  'from': window_start.isoformat(timespec='seconds'),
-                  'to': window_end.isoformat(timespec='seconds')}
+        windows.append((window_start, window_end))
+        window_end = window_start
+    return windows
+
+def list_window(api, user, window):
+    """return a host's recordings (as raw JSON) within one listing window"""
+    window_start, window_end = window
+    params = {'max': PAGE,
+              'hostEmail': user,
+              'from': window_start.isoformat(timespec='seconds'),
+              'to': window_end.isoformat(timespec='seconds')}
+    # listed through the SDK session rather than recordings.list(), which (still in
+    # webexpythonsdk 2.0.6) rejects any call that omits integrationTag and sends max as a bogus
+    # max_recordings query param; the session follows the pagination links within the window
+    return list(list_json(api, 'recordings', **params))
+
+def list_recordings(api, since, found, failed):
+    """yield every recording (as raw JSON) of the hosts since their start dates, as it is listed
+
+    since maps each host to the oldest time to list from. The API caps a query at a 30-day
+    span, so each range is split into windows; every host's windows are independent, so they
+    are all listed METADATA_WORKERS at a time and each window's recordings yielded as soon as
+    it is in. found counts recordings per host; a host with a window that fails is added to
+    failed.
+    """
+    seen = set()
+    queries = [(user, window) for user, oldest in since.items()
+               for window in listing_windows(oldest)]
+    listings = concurrent_map(lambda query: list_window(api, *query), queries,
+                              workers=METADATA_WORKERS)
+    for (user, _), listing in listings:
         try:
-            for item in sdk_list_recordings(api, params):
-                # adjacent windows meet exactly at their boundary, so dedupe by id
-                recordings[item.id] = item
+            items = listing.result()
         except ApiError as error:
-            print(f'### could not list recordings: {error}')
-            return None
-        window_end = window_start
-    return list(recordings.values())
-
-def unique_filename(name, used):
-    """return a name unique within this run, appending a counter on collision"""
-    root, ext = os.path.splitext(name)
-    candidate = name
-    counter = 2
-    while candidate in used:
-        candidate = f'{root} ({counter}){ext}'
-        counter += 1
-    used.add(candidate)
-    return candidate
+            print(f'\n### could not list recordings of {user}: {error}')
+            failed.add(user)
+            continue
+        for item in items:
+            # adjacent windows meet exactly at their boundary, so dedupe by id
+            if item['id'] not in seen:
+                seen.add(item['id'])
+                found[user] += 1
+                yield item
+
+def list_org_window(api, window):
+    """return every recording in the org (as raw JSON) within one listing window"""
+    window_start, window_end = window
+    params = {'max': PAGE,
+              'from': window_start.isoformat(timespec='seconds'),
+              'to': window_end.isoformat(timespec='seconds')}
+    return list(list_json(api, 'admin/recordings', **params))
+
+def list_org_recordings(api, hosts, oldest, found, failed):
+    """yield every recording in the org since oldest, or only the given hosts' ones
+
+    The admin listing covers every host at once, so each window costs one query chain however
+    many hosts there are; windows are listed METADATA_WORKERS at a time and the hosts filtered
+    here. found counts recordings per host; a window that fails adds ORG_KEY to failed.
+    """
+    wanted = {host.lower() for host in hosts}
+    seen = set()
+    listings = concurrent_map(lambda window: list_org_window(api, window),
+                              listing_windows(oldest), workers=METADATA_WORKERS)
+    for (window_start, window_end), listing in listings:
+        try:
+            items = listing.result()
+        except ApiError as error:
+            print(f'\n### could not list recordings from {window_start:%Y-%m-%d} to '
+                  f'{window_end:%Y-%m-%d}: {error}')
+            failed.add(ORG_KEY)
+            continue
+        for item in items:
+            host = (item.get('hostEmail') or '').lower()
+            if wanted and host not in wanted:
+                continue
+            # adjacent windows meet exactly at their boundary, so dedupe by id
+            if item['id'] not in seen:
+                seen.add(item['id'])
+                found[host] += 1
+                yield item
+
+def write_index(path, recordings):
+    """write the INDEX_FIELDS of each recording to a JSONL index; return how many were written"""
+    count = 0
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as index_file:
+        for recording in recordings:
+            index_file.write(json.dumps({field: recording.get(field) for field in INDEX_FIELDS},
+                                        ensure_ascii=False) + '\n')
+            count += 1
+    os.replace(temp_path, path)
+    return count
+
+def read_index(path, found, hosts=()):
+    """return the recordings in a JSONL index, counting them per host in found
+
+    The whole index is read up front, so a missing or damaged file is reported before anything
+    is downloaded. Given hosts, only their recordings are returned.
+    """
+    recordings = list()
+    with open(path, 'r', encoding='utf-8') as index_file:
+        for line in index_file:
+            if line.strip():
+                recording = json.loads(line)
+                host = (recording.get('hostEmail') or '').lower()
+                if hosts and host not in hosts:
+                    continue
+                found[host] += 1
+                recordings.append(recording)
+    return recordings
+
+class NameIndex:
+    """the filenames taken in each download directory, for handing out collision-free names
+
+    A directory's names are read from disk when it is first used, along with any the manifest
+    has planned there. After that a clash on "Topic.mp4" goes straight to the next counter kept
+    for that name -- "Topic (3).mp4" -- instead of probing "(2)", "(3)", ... again each time.
+    Names compare case-insensitively, as they do on Windows and macOS filesystems.
+    """
+
+    def __init__(self, planned=()):
+        self._taken = dict()
+        self._counters = dict()
+        self._planned = defaultdict(set)
+        for path in planned:
+            directory, name = os.path.split(path)
+            self._planned[directory].add(name.casefold())
+
+    def taken(self, directory):
+        """return the set of (casefolded) names taken in a directory, creating it if need be"""
+        names = self._taken.get(directory)
+        if names is None:
+            os.makedirs(directory or '.', exist_ok=True)
+            # a stray .part file holds its name too, or a new file would "resume" it
+            names = {name.casefold()[:-len('.part')] if name.endswith('.part') else name.casefold()
+                     for name in os.listdir(directory or '.')}
+            names |= self._planned.pop(directory, set())
+            self._taken[directory] = names
+        return names
+
+    def claim(self, directory, name):
+        """reserve a name in directory, adding " (n)" if it is taken; return its path"""
+        names = self.taken(directory)
+        candidate = name
+        if name.casefold() in names:
+            root, ext = os.path.splitext(name)
+            key = (directory, name.casefold())
+            counter = self._counters.get(key, 2)
+            candidate = f'{root} ({counter}){ext}'
+            while candidate.casefold() in names:
+                counter += 1
+                candidate = f'{root} ({counter}){ext}'
+            self._counters[key] = counter + 1
+        names.add(candidate.casefold())
+        return os.path.join(directory, candidate) if directory else candidate
+
+def recording_directory(summary, layout):
+    """return the directory a recording is filed in: host/year/month with layout, else here"""
+    if not layout:
+        return ''
+    host = re.sub(r'[^\w\-.@]', '_', summary.get('hostEmail') or 'unknown host')
+    created = summary.get('createTime') or '0000-00'
+    return os.path.join(host, created[:4], created[5:7])
+
+def media_files(details, directory, names, manifest):
+    """return (path, link) for each file of a recording still to be downloaded
+
+    A file keeps the path planned for it by an earlier run (so its .part file is resumed); new
+    names are claimed in directory from the NameIndex and planned in the manifest here, in the
+    one thread planning the downloads, so concurrent transfers never share a path.
+    """
+    # the SDK's Recording model doesn't expose temporaryDirectDownloadLinks as a property, so
+    # read it from the raw payload; it is empty e.g. for a recording still transcoding
+    links = details.json_data.get('temporaryDirectDownloadLinks') or {}
+
+    # name files after the recording topic, sanitized for the filesystem
+    topic = details.topic or details.id
+    safe_topic = re.sub(r'[^\w\-. ]', '_', topic).strip() or details.id
+
+    planned = manifest.planned.get(details.id, dict())
+    claimed = dict()
+    files = list()
+    for link_type in LINK_TYPES:
+        link = links.get(link_type['key'])
+        # e.g. a recording with no transcript available
+        if not link:
+            continue
+        name = planned.get(link_type['ext'])
+        if name is None:
+            name = claimed[link_type['ext']] = \
+                names.claim(directory, f'{safe_topic}.{link_type["ext"]}')
+        if not manifest.saved(name):
+            files.append((name, link))
+    if claimed:
+        manifest.plan(details.id, claimed)
+    return files
+
+def expected_size(response, offset):
+    """return the full size of the file a (possibly ranged) response is part of, if known"""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range and not content_range.endswith('/*'):
+        return int(content_range.rsplit('/', 1)[1])
+    length = response.headers.get('Content-Length')
+    return int(length) + offset if length is not None else None
+
+def file_digest(path):
+    """return the SHA-256 hash object of a file's contents, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1048576), b''):
+            digest.update(block)
+    return digest
+
+def download_stream(link, part, web_client, progress):
+    """download a link into its .part file in one stream, resuming what the file holds
+
+    Returns (size, SHA-256 hex digest) once the file holds as many bytes as the server said it
+    has. A large file on a server that honours Range requests is handed to download_segments.
+    """
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    # asking for a range even from the start shows whether the server supports them, and the
+    # file's full size, before any of the body is read
+    with web_client.get(link, headers={'Range': f'bytes={offset}-'}, stream=True) as response:
+        if offset and response.status_code == 416:
+            content_range = response.headers.get('Content-Range', '')
+            if content_range.endswith(f'/{offset}'):
+                # the .part file already holds every byte (a run stopped before renaming it)
+                return offset, file_digest(part).hexdigest()
+            # the .part file doesn't fit what the server now has; start it over
+            os.remove(part)
+            return download_stream(link, part, web_client, progress)
+        response.raise_for_status()
+        size = expected_size(response, offset if response.status_code == 206 else 0)
+        if not offset and response.status_code == 206 and size and size >= SEGMENT_THRESHOLD:
+            response.close()
+            return download_segments(link, part, web_client, progress, size)
+        if offset and response.status_code == 206:
+            # carry on from the end of the .part file, hashing what it already holds
+            digest = file_digest(part)
+        else:
+            offset = 0
+            digest = hashlib.sha256()
+        with open(part, 'ab' if offset else 'wb') as file:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if STOPPING.is_set():
+                    raise InterruptedError(f'stopped, kept as {part}')
+                file.write(chunk)
+                digest.update(chunk)
+                progress.advance(len(chunk))
+    saved = os.path.getsize(part)
+    if size is not None and saved != size:
+        raise OSError(f'transfer ended at {saved} of {size} bytes, kept as {part}')
+    return saved, digest.hexdigest()
+
+def download_segments(link, part, web_client, progress, size=None):
+    """download a large link into its .part file as SEGMENTS byte ranges fetched in parallel
+
+    The .part file is preallocated at full size and each range written in place; how far every
+    range has got is checkpointed to "<part>.segments" (flushed data only), so a run cut short
+    carries each range on from there -- call without size to resume. Returns (size, SHA-256
+    hex digest) once every range is complete.
+    """
+    segments_file = part + '.segments'
+    if size is None:
+        try:
+            with open(segments_file, 'r', encoding='utf-8') as state_file:
+                state = json.load(state_file)
+            size = state['size']
+            problem = None if os.path.exists(part) and os.path.getsize(part) == size else \
+                'the .part file is missing or not the size it was preallocated at'
+        except (OSError, ValueError, KeyError) as error:
+            problem = f'its checkpoint is unreadable: {error}'
+        if problem:
+            # a checkpoint we can't trust makes the whole .part file untrustworthy, and one
+            # without its .part file has nothing to resume
+            print(f'\n### discarding {part}, {problem}')
+            if os.path.exists(part):
+                os.remove(part)
+            os.remove(segments_file)
+            return download_stream(link, part, web_client, progress)
+    else:
+        step = -(-size // SEGMENTS)
+        state = {'size': size,
+                 'ranges': [[start, min(start + step, size) - 1, start]
+                            for start in range(0, size, step)]}
+    lock = threading.Lock()
+    # set when one range fails, so the others checkpoint and stop rather than run to the end
+    halt = threading.Event()
+
+    def save():
+        temp_path = segments_file + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, segments_file)
+
+    def checkpoint(segment, position):
+        with lock:
+            segment[2] = position
+            save()
+
+    def fetch(segment):
+        start, end, position = segment
+        if position > end:
+            return
+        with web_client.get(link, headers={'Range': f'bytes={position}-{end}'},
+                            stream=True) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise OSError(f'server stopped honouring byte ranges, kept as {part}')
+            with open(part, 'r+b') as file:
+                file.seek(position)
+                unsaved = 0
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if STOPPING.is_set() or halt.is_set():
+                        file.flush()
+                        checkpoint(segment, position)
+                        raise InterruptedError(f'stopped, kept as {part}')
+                    chunk = chunk[:end + 1 - position]
+                    file.write(chunk)
+                    position += len(chunk)
+                    unsaved += len(chunk)
+                    progress.advance(len(chunk))
+                    if unsaved >= SEGMENT_CHECKPOINT:
+                        file.flush()
+                        checkpoint(segment, position)
+                        unsaved = 0
+                    if position > end:
+                        break
+        checkpoint(segment, position)
+
+    if not os.path.exists(segments_file):
+        with open(part, 'wb') as file:
+            file.truncate(size)
+        save()
+    with ThreadPoolExecutor(max_workers=len(state['ranges'])) as pool:
+        fetches = [pool.submit(fetch, segment) for segment in state['ranges']]
+        finished, _ = wait(fetches, return_when=FIRST_EXCEPTION)
+        for fetched in finished:
+            if fetched.exception():
+                halt.set()
+                for other in fetches:
+                    other.cancel()
+                raise fetched.exception()
+    missing = sum(end + 1 - position for _, end, position in state['ranges'])
+    if missing or os.path.getsize(part) != size:
+        raise OSError(f'{missing} of {size} bytes still to fetch, kept as {part}')
+    digest = file_digest(part)
+    os.remove(segments_file)
+    return size, digest.hexdigest()
+
+def download(recording_id, link, filename, web_client, progress, manifest):
+    """download one media link to filename via its .part file; True once it is saved
+
+    The file is only renamed into place, and recorded in the manifest, once it holds as many
+    bytes as the server said it has; anything short stays a .part file for the next run.
+    """
+    part = filename + '.part'
+    try:
+        if os.path.exists(part + '.segments'):
+            # an interrupted segmented download: carry on each of its ranges
+            size, sha256 = download_segments(link, part, web_client, progress)
+        else:
+            size, sha256 = download_stream(link, part, web_client, progress)
+        os.replace(part, filename)
+    except InterruptedError:
+        # the run is stopping; the .part file is resumed next time
+        return False
+    except (requests.RequestException, OSError, ValueError) as error:
+        print(f'\n### could not download {filename}: {error}')
+        progress.finished(False)
+        return False
+    manifest.record(recording_id, filename, size, sha256)
+    progress.finished(True)
+    return True
 
 def main():
     """downloads all recordings and transcripts for the supplied host users"""
@@ -121,74 +718,193 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
-    users_input = input('Enter host email(s) to download recordings for (comma-separated): ')
-    users = [email.strip() for email in users_input.split(',') if email.strip()]
-    if not users:
-        print('### No host emails provided, exiting.')
-        exit()
+    parser = argparse.ArgumentParser(
+        description='Download Webex recordings and transcripts for host users or a whole org.')
+    parser.add_argument('hosts', nargs='*', metavar='host_email',
+                        help='host(s) to download for; with --org, only these hosts are kept')
+    parser.add_argument('--days', type=int,
+                        help=f'days back to search (default: {DEFAULT_DAYS_BACK})')
+    parser.add_argument('--org', action='store_true',
+                        help='list recordings org-wide into an index, then download from it')
+    parser.add_argument('--index', default=INDEX_FILE,
+                        help='index file --org writes (default: %(default)s)')
+    parser.add_argument('--list-only', action='store_true',
+                        help='with --org, write the index and stop')
+    parser.add_argument('--from-index', metavar='FILE',
+                        help='download the recordings in an index from an earlier --org run')
+    parser.add_argument('--sync', action='store_true',
+                        help='list only since each host\'s last sync; file by host/year/month')
+    parser.add_argument('--max-rate', type=transfer_rate, metavar='RATE',
+                        help='cap the combined download rate in bytes/s, e.g. 500K or 20M')
+    parser.add_argument('--order', choices=ORDERS, default='listed',
+                        help='download order (default: %(default)s)')
+    args = parser.parse_args()
+    if args.list_only and not args.org:
+        parser.error('--list-only only applies with --org')
+    if args.org and args.from_index:
+        parser.error('--org lists the org afresh; it cannot be combined with --from-index')
+    if args.sync and (args.from_index or args.list_only):
+        parser.error('--sync lists as it goes; it cannot be combined with --from-index or '
+                     '--list-only')
+    if args.sync and not (args.hosts or args.org):
+        parser.error('--sync needs host email(s) or --org')
 
-    days_input = input(f'How many days back to search? [{DEFAULT_DAYS_BACK}]: ').strip()
-    try:
-        days_back = int(days_input) if days_input else DEFAULT_DAYS_BACK
-    except ValueError:
-        print('### Invalid number of days, exiting.')
-        exit()
+    users = [email.strip().lower() for email in args.hosts]
+    days_back = args.days or DEFAULT_DAYS_BACK
+    if not (users or args.org or args.from_index):
+        users_input = input('Enter host email(s) to download recordings for (comma-separated): ')
+        users = [email.strip().lower() for email in users_input.split(',') if email.strip()]
+        if not users:
+            print('### No host emails provided, exiting.')
+            exit()
+
+        if args.days is None:
+            days_input = input(f'How many days back to search? [{DEFAULT_DAYS_BACK}]: ').strip()
+            try:
+                days_back = int(days_input) if days_input else DEFAULT_DAYS_BACK
+            except ValueError:
+                print('### Invalid number of days, exiting.')
+                exit()
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work,
     # including pagination and rate-limit (429) retries
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     # the temporary direct download links are pre-signed plain-file URLs outside the API,
     # so the media transfers themselves stay on a requests session
     web_client = requests.Session()
+    # one pooled connection per range of every transfer, so none is dropped and re-opened
+    web_client.mount('https://', requests.adapters.HTTPAdapter(
+        pool_maxsize=TRANSFER_WORKERS * SEGMENTS))
 
-    # track names already written so same-topic recordings don't overwrite each other
-    used_names = set()
+    # track names already taken -- on disk, or planned by this run or an earlier one -- so
+    # same-topic recordings don't overwrite each other
+    manifest = Manifest(MANIFEST_FILE)
+    names = NameIndex(name for planned in manifest.planned.values()
+                      for name in planned.values())
 
-    for user in users:
-        print(f'Retrieving recording list for {user}...')
-        items = list_recordings(api, user, days_back)
+    # --sync lists each host from its last successful sync (a host new to it, --days back);
+    # the sync times saved at the end are when this run started listing
+    started = datetime.now(timezone.utc)
+    sync_keys = users or [ORG_KEY]
+    sync_state = load_sync_state(SYNC_FILE) if args.sync else dict()
+    since = {key: sync_state[key] - SYNC_OVERLAP if key in sync_state
+             else started - timedelta(days=days_back) for key in sync_keys}
+    failed = set()
 
-        if items is None:
-            continue
+    def sync_key(summary):
+        return (summary.get('hostEmail') or '').lower() if users else ORG_KEY
 
-        if not items:
-            print(f'{user} has no recordings.\n')
-            continue
+    def note_failure(key, transfer):
+        if transfer.cancelled() or transfer.exception() or not transfer.result():
+            failed.add(key)
+
+    # listing, detail lookups and downloads all overlap: recordings flow on to the next stage
+    # as each listing window comes in. Those saved in full by an earlier run go no further.
+    found = Counter()
+    if args.from_index:
+        try:
+            recordings = read_index(args.from_index, found, users)
+        except (OSError, ValueError) as error:
+            print(f'### Could not read the index {args.from_index}: {error} ###')
+            sys.exit(1)
+    elif args.org:
+        print('Retrieving the org\'s recording list' + (f' for {len(users)} host(s)...'
+                                                       if users else '...'))
+        count = write_index(args.index, list_org_recordings(api, users, min(since.values()),
+                                                            found, failed))
+        print(f'Wrote {count} recording(s) to {args.index}.')
+        if args.list_only:
+            return
+        found = Counter()
+        recordings = read_index(args.index, found)
+    else:
+        print(f'Retrieving recording lists for {len(users)} host(s)...')
+        recordings = list_recordings(api, since, found, failed)
+    pending = (summary for summary in recordings if not manifest.complete(summary['id']))
+    if ORDERS[args.order]:
+        pending = sorted(pending, key=ORDERS[args.order])
+        print(f'{len(pending)} recording(s), '
+              f'{sum(summary.get("sizeBytes") or 0 for summary in pending) / 1073741824:.1f} GB '
+              f'to download; {shutil.disk_usage(".").free / 1073741824:.1f} GB free.')
+
+    # only queue what fits in the disk space free at the start, less what is already queued
+    room = shutil.disk_usage('.').free - DISK_HEADROOM
+    no_room = list()
+
+    def affordable(recordings):
+        nonlocal room
+        for summary in recordings:
+            size = summary.get('sizeBytes') or 0
+            if size > room:
+                no_room.append(summary)
+                failed.add(sync_key(summary))
+                continue
+            room -= size
+            yield summary
+
+    looked_up = 0
 
-        print(f'{user} has {len(items)} recording(s)...')
-        for count, summary in enumerate(items, 1):
-            print_status(f'Downloading recording {count} of {len(items)}...')
+    # each queued transfer holds a slot until it ends, so detail lookups (and the short-lived
+    # links they return) only run a couple of transfers' worth ahead of the downloads
+    slots = threading.BoundedSemaphore(TRANSFER_WORKERS * 2)
+    progress = Progress(TokenBucket(args.max_rate) if args.max_rate else None)
+    transfers = ThreadPoolExecutor(max_workers=TRANSFER_WORKERS)
+    try:
+        lookups = concurrent_map(lambda summary: api.recordings.get(summary['id']),
+                                 affordable(pending), workers=METADATA_WORKERS)
+        for summary, lookup in lookups:
+            looked_up += 1
             try:
-                details = api.recordings.get(summary.id)
+                details = lookup.result()
             except ApiError as error:
-                print(f'### could not get details for {summary.id}: {error}')
-                continue
-            # the SDK's Recording model doesn't expose temporaryDirectDownloadLinks as a
-            # property, so read it from the raw payload
-            links = details.json_data.get('temporaryDirectDownloadLinks') or {}
-            if not links:
-                # e.g. a recording still transcoding, or with no downloadable content
+                print(f'\n### could not get details for {summary["id"]}: {error}')
+                failed.add(sync_key(summary))
                 continue
+            directory = recording_directory(summary, args.sync)
+            for filename, link in media_files(details, directory, names, manifest):
+                slots.acquire()
+                progress.queued()
+                transfer = transfers.submit(download, details.id, link, filename, web_client,
+                                            progress, manifest)
+                transfer.add_done_callback(partial(note_failure, sync_key(summary)))
+                transfer.add_done_callback(lambda _: slots.release())
+        transfers.shutdown()
+    except BaseException:
+        # Ctrl-C or an unexpected error: drop the queued transfers and stop those under way
+        # rather than waiting for every one of them to finish
+        STOPPING.set()
+        transfers.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        manifest.close()
 
-            # name files after the recording topic, sanitized for the filesystem
-            topic = details.topic or summary.id
-            safe_topic = re.sub(r'[^\w\-. ]', '_', topic).strip() or summary.id
-
-            for link_type in LINK_TYPES:
-                link = links.get(link_type['key'])
-                if not link:
-                    # e.g. a recording with no transcript available
-                    continue
-                filename = unique_filename(f'{safe_topic}.{link_type["ext"]}', used_names)
-                with web_client.get(link, stream=True) as download:
-                    with open(filename, 'wb') as file:
-                        for chunk in download.iter_content(chunk_size=8192):
-                            file.write(chunk)
+    if args.sync:
+        # an org-wide listing that failed leaves every host to be listed again
+        synced = [key for key in sync_keys
+                  if key not in failed and ORG_KEY not in failed]
+        sync_state.update((key, started) for key in synced)
+        save_sync_state(SYNC_FILE, sync_state)
 
-        print('\n')
+    print('\n')
+    for user in users:
+        print(f'{user} has {found[user]} recording(s).' if found[user] else
+              f'{user} has no recordings.')
+    if not users:
+        print(f'{sum(found.values())} recording(s) from {len(found)} host(s).')
+    skipped = sum(found.values()) - looked_up - len(no_room)
+    if skipped:
+        print(f'Skipped {skipped} recording(s) already downloaded.')
+    if no_room:
+        print(f'### Left out {len(no_room)} recording(s), '
+              f'{sum(summary.get("sizeBytes") or 0 for summary in no_room) / 1073741824:.1f} GB, '
+              'for lack of disk space; free some and run again to fetch them.')
+    print(f'{progress.done} file(s) downloaded'
+          + (f', {progress.failed} failed.' if progress.failed else '.'))
+    if args.sync and len(synced) < len(sync_keys):
+        print(f'### {len(sync_keys) - len(synced)} host(s) not fully synced; '
+              'the next --sync run lists them again from their last sync.')
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -19,6 +19,11 @@ Exports scheduled Webex meetings for a set of host users to CSV. Reads a file of
 addresses, then for each host queries their meetings within a forward date window and prints
 one row per meeting (start, end, recurrence, title, meeting number, host).
 
+Usage: export_meetings.py [--jsonl]
+  --jsonl  instead of CSV, write each meeting to stdout as a JSON record (the meeting's own
+           fields plus the hostEmail it was listed for), one per line as it is retrieved.
+The prompts are written to stderr, so stdout holds only the CSV or JSONL and can be redirected.
+
 Requires an auth token from a user with admin privileges against the Webex Control Hub org.
 """
 
@@ -28,7 +33,9 @@ import sys
 from datetime import datetime, timedelta, timezone
 
 import yaml
-from webexpythonsdk import ApiError, WebexAPI
+from webexpythonsdk import ApiError
+
+from wxcommon import emit_record, run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -53,6 +60,11 @@ def read_email_list(path):
         raise SystemExit(1)
     return emails
 
+def ask(prompt):
+    """read one line of input, prompting on stderr so stdout stays pure CSV/JSONL"""
+    print(prompt, end='', file=sys.stderr, flush=True)
+    return input().strip()
+
 def main():
     """export scheduled meetings for a list of host users to CSV"""
     # Windows consoles/pipes default to cp1252, which can't encode emoji or other non-Latin-1
@@ -64,18 +76,19 @@ def main():
         except (AttributeError, ValueError):
             pass
 
+    jsonl = '--jsonl' in sys.argv[1:]
+
     with open(CONFIG_FILE, 'r') as config_file:
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
-    email_file = input('Enter path to a file of host email addresses (one per line): ').strip()
+    email_file = ask('Enter path to a file of host email addresses (one per line): ')
     users = read_email_list(email_file)
 
-    site_url = input('Enter the Webex site URL (e.g. example.webex.com): ').strip()
+    site_url = ask('Enter the Webex site URL (e.g. example.webex.com): ')
 
-    days_input = input(f'How many days ahead to include? [{DEFAULT_DAYS}]: ').strip()
+    days_input = ask(f'How many days ahead to include? [{DEFAULT_DAYS}]: ')
     try:
         days = int(days_input) if days_input else DEFAULT_DAYS
     except ValueError:
@@ -87,10 +100,11 @@ def main():
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work,
     # including pagination and rate-limit (429) retries
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     writer = csv.writer(sys.stdout)
-    writer.writerow(CSV_HEADER)
+    if not jsonl:
+        writer.writerow(CSV_HEADER)
 
     for user in users:
         print(f'Retrieving meetings for {user}...', file=sys.stderr)
@@ -102,6 +116,9 @@ def main():
                 to=date_to.isoformat(timespec='seconds'),
                 siteUrl=site_url)
             for meeting in meetings:
+                if jsonl:
+                    emit_record({**meeting.json_data, 'hostEmail': user})
+                    continue
                 writer.writerow([
                     meeting.start or '',
                     meeting.end or '',
@@ -116,4 +133,4 @@ def main():
             raise SystemExit(1)
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
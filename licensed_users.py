@@ -22,9 +22,11 @@ import itertools
 import os
 import shutil
 import sys
+from collections import namedtuple
 
 import yaml
-from webexpythonsdk import WebexAPI
+
+from wxcommon import list_json, read_ahead, run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -34,6 +36,9 @@ CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.ym
 SPINNER = itertools.cycle(['-', '/', '|', '\\'])
 PAGE_SIZE = 500
 
+# the few fields kept per user -- a tuple rather than the full person payload, for big orgs
+LicensedUser = namedtuple('LicensedUser', ['name', 'email'])
+
 def print_status(text, linefeed=0):
     """output status line"""
     text = f'{next(SPINNER)} {text}'
@@ -59,12 +64,11 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
     # optional: query a specific org by id, only applied when set in config.yml
     org_id = wxteams_config.get('org_id')
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     # orgId is only passed when an org_id is present in config.yml
     org_query = {'orgId': org_id} if org_id else {}
@@ -78,13 +82,16 @@ def main():
         license_users[wx_license.id] = list()
 
     # Query a list of all users and bucket them under each license they hold.
-    for user in api.people.list(max=PAGE_SIZE, **org_query):
-        print_status(f'Grabbing list of users: {user.displayName}')
-        if user.licenses:
-            for license_id in user.licenses:
+    # the next page of people is fetched in the background while this one is bucketed
+    for user in read_ahead(list_json(api, 'people', max=PAGE_SIZE, **org_query),
+                           page_size=PAGE_SIZE):
+        print_status(f'Grabbing list of users: {user.get("displayName")}')
+        if user.get('licenses'):
+            entry = LicensedUser(user.get('displayName'), user['emails'][0])
+            for license_id in user['licenses']:
                 # users can carry licenses from other orgs; skip any we did not enumerate
                 if license_id in license_users:
-                    license_users[license_id].append({'name': user.displayName, 'email': user.emails[0]})
+                    license_users[license_id].append(entry)
 
     print_status('Finished querying users.', linefeed=2)
 
@@ -92,8 +99,8 @@ def main():
         wx_license = licenses[license_id]
         print(f'**{wx_license.name}** ({wx_license.consumedUnits}/{wx_license.totalUnits} units assigned)')
         for user in users:
-            print(f'* {user["name"]} ({user["email"]})')
+            print(f'* {user.name} ({user.email})')
         print()
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
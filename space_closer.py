@@ -18,15 +18,25 @@
 Prompts for a space name, searches for space, confirms match and then empties space of all
 users, effectively "closing" it.
 
+Usage: space_closer.py [--resume <journal>]
+
+Once confirmed, every removal (and space deletion) is written to a journal file (named in the
+output) before the first is sent, and each is marked off as it completes. If a run is cut short,
+--resume <journal> carries on with the removals still outstanding, without searching again.
+
 Requires an auth token from a user with admin privileges against the Webex Control Hub org.
 """
 
 import datetime
+import itertools
 import os
 import sys
+from collections import namedtuple
 
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+
+from wxcommon import (OperationJournal, journal_path, list_json, read_ahead, resume_argument,
+                      run_journal, run_main, webex_api)
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -37,9 +47,15 @@ CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.ym
 USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
               ' (KHTML, like Gecko) Chrome/74.0.3729.169 Safari/537.36')
 
+TOOL = 'space_closer'
+USAGE = 'Usage: space_closer.py [--resume <journal>]'
+
 STALE_DAYS = 60
 EMPTY_THRESHOLD = 1
 
+# the fields kept per membership of a space being emptied, rather than the full payload
+Member = namedtuple('Member', ['id', 'personId', 'personDisplayName'])
+
 def bad_choice():
     """print error string and exit"""
     print('### No spaces found or invalid selection made, exiting.')
@@ -73,44 +89,52 @@ def timestamp():
 
 def matchlist_entry(wx_space):
     """returns dict with space matchlist entry"""
-    return {'title': wx_space.title,
-            'lastActivity': wx_space.lastActivity,
-            'id': wx_space.id,
-            'creatorId': wx_space.creatorId}
-
-def leave_space(members, myself, api):
-    """iterate space members and remove ourself"""
-    for member in members:
-        if member.personId == myself:
-            print('Removing ourselves...')
-            membership_delete(member.id, api)
-
-def empty_space(members, myself, api):
-    """remove every member from the space, leaving ourself for last"""
+    return {'title': wx_space.get('title'),
+            'lastActivity': wx_space.get('lastActivity'),
+            'id': wx_space['id'],
+            'creatorId': wx_space.get('creatorId')}
+
+def space_members(room_id, api):
+    """materialize a space's membership list as compact Member tuples"""
+    # materialized up front; deleting members while the generator is still paginating would
+    # skip people
+    return [Member(member['id'], member.get('personId'), member.get('personDisplayName'))
+            for member in list_json(api, 'memberships', roomId=room_id)]
+
+def leave_space(members, myself):
+    """plan removing ourself from the space"""
+    return [{'action': 'membership_delete', 'id': member.id, 'name': 'ourselves'}
+            for member in members if member.personId == myself]
+
+def empty_space(members, myself):
+    """plan removing every member from the space, leaving ourself for last"""
+    operations = list()
     own_membership_id = None
     for member in members:
         if member.personId == myself:
             own_membership_id = member.id
             continue
-        print(f'Removing {member.personDisplayName}...')
-        membership_delete(member.id, api)
+        operations.append({'action': 'membership_delete',
+                           'id': member.id,
+                           'name': member.personDisplayName})
     if own_membership_id:
-        print('Removing ourselves...')
-        membership_delete(own_membership_id, api)
-
-def membership_delete(membership_id, api):
-    """execute delete call, wrapped in error handler because errors happen on the reg here"""
-    try:
-        api.memberships.delete(membership_id)
-    except ApiError as error:
-        print(f'#### API error: {error}')
-
-def room_delete(room_id, api):
-    """execute delete call, wrapped in error handler so one failure doesn't abort the run"""
-    try:
-        api.rooms.delete(room_id)
-    except ApiError as error:
-        print(f'#### API error: {error}')
+        operations.append({'action': 'membership_delete',
+                           'id': own_membership_id,
+                           'name': 'ourselves'})
+    return operations
+
+def perform_operation(operation, api):
+    """execute one planned delete call"""
+    if operation['action'] == 'room_delete':
+        print(f'Closing {operation["name"]}...')
+        api.rooms.delete(operation['id'])
+    else:
+        print(f'Removing {operation["name"]}...')
+        api.memberships.delete(operation['id'])
+
+def report_failure(operation, error):
+    """report a delete call that failed; errors happen on the reg here"""
+    print(f'#### API error: {error}')
 
 def main():
     """allows user to 'close' one or more spaces in Webex"""
@@ -123,40 +147,60 @@ def main():
         except (AttributeError, ValueError):
             pass
 
+    resume_path = resume_argument(USAGE)
+
     with open(CONFIG_FILE, 'r') as config_file:
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
+
+    if resume_path:
+        try:
+            journal = OperationJournal.load(resume_path, TOOL)
+        except (OSError, ValueError) as error:
+            print(f'### Could not resume from journal: {error}')
+            sys.exit(1)
+        api = webex_api(CONFIG_FILE, wxteams_config, wait_on_rate_limit=True)
+        run_journal(journal, lambda operation: perform_operation(operation, api),
+                    report_failure, 404)
+        print('Complete.')
+        return
 
     wxteams_spacequery = input('Please enter name of space to close (or \'stale\'): ')
 
     # Query Webex API for its list of users, webexpythonsdk abstracts most of the work
     # https://github.com/WebexCommunity/WebexPythonSDK/
     print('Building space list, please wait...')
-    api = WebexAPI(access_token=wxteams_token, wait_on_rate_limit=True)
+    api = webex_api(CONFIG_FILE, wxteams_config, wait_on_rate_limit=True)
 
     # Grab our personId, we'll need it later
     wxteams_me = api.people.me().id
 
     # Populate list of query matches from full list, case insensitive
     wx_space_matchlist = list()
-    wx_space_fulllist = list(api.rooms.list(type='group'))
+    # streamed rather than materialized: only one of the branches below walks it, and the stale
+    # scan's per-space message queries overlap with the next page of rooms being fetched
+    wx_space_fulllist = read_ahead(list_json(api, 'rooms', type='group'))
 
     if wxteams_spacequery == 'stale':
         print('Finding stale spaces, this may take quite some time...')
         stale_threshold = datetime.date.today() - datetime.timedelta(days=STALE_DAYS)
         # wx_space_fulllist = api.rooms.list(type='group', sortBy='lastactivity')
         for wx_space in wx_space_fulllist:
-            if not wx_space.lastActivity or old_date(str(wx_space.lastActivity), stale_threshold):
-                wx_space_messages = list(api.messages.list(roomId=wx_space.id, max=500))
-                if len(wx_space_messages) <= EMPTY_THRESHOLD:
+            last_activity = wx_space.get('lastActivity')
+            if not last_activity or old_date(last_activity, stale_threshold):
+                # only whether there are more than EMPTY_THRESHOLD messages matters, so fetch
+                # just one past it rather than a page of up to 500
+                wx_space_messages = sum(1 for _ in itertools.islice(
+                    list_json(api, 'messages', roomId=wx_space['id'], max=EMPTY_THRESHOLD + 1),
+                    EMPTY_THRESHOLD + 1))
+                if wx_space_messages <= EMPTY_THRESHOLD:
                     wx_space_matchlist.append(matchlist_entry(wx_space))
     else:
         # Grab our group spaces
         # wx_space_fulllist = api.rooms.list(type='group', sortBy='lastactivity')
         for wx_space in wx_space_fulllist:
-            if wxteams_spacequery.upper() in wx_space.title.upper():
+            if wxteams_spacequery.upper() in (wx_space.get('title') or '').upper():
                 wx_space_matchlist.append(matchlist_entry(wx_space))
 
     # Finalize space list
@@ -198,25 +242,31 @@ def main():
         wx_space_remove_all = True
 
     if confirmed(f'{wx_space_matchtitle} selected, are you sure?'):
+        # plan every call first so the whole run is journaled before anything is deleted
+        operations = list()
         for wx_space in wx_space_matchlist:
             print(f'Working on {wx_space["title"]}')
             if wx_space_remove_all and wx_space['creatorId'] == wxteams_me:
                 print('ALL selected and our space, closing')
-                room_delete(wx_space['id'], api)
+                operations.append({'action': 'room_delete',
+                                   'id': wx_space['id'],
+                                   'name': wx_space['title']})
             elif wx_space_remove_all:
                 print('ALL selected and NOT our space, leaving')
-                wx_space_members = list(api.memberships.list(roomId=wx_space['id']))
-                leave_space(wx_space_members, wxteams_me, api)
+                wx_space_members = space_members(wx_space['id'], api)
+                operations.extend(leave_space(wx_space_members, wxteams_me))
             else:
-                # materialize the membership list up front; deleting members while the
-                # generator is still paginating would skip people
                 print('Emptying space of all members...')
-                wx_space_members = list(api.memberships.list(roomId=wx_space['id']))
-                empty_space(wx_space_members, wxteams_me, api)
-            print('Complete.')
+                wx_space_members = space_members(wx_space['id'], api)
+                operations.extend(empty_space(wx_space_members, wxteams_me))
+
+        journal = OperationJournal.create(journal_path(TOOL), TOOL, operations)
+        run_journal(journal, lambda operation: perform_operation(operation, api),
+                    report_failure, 404)
+        print('Complete.')
 
     else:
         bad_choice()
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
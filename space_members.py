@@ -25,7 +25,8 @@ import os
 import sys
 
 import yaml
-from webexpythonsdk import WebexAPI
+
+from wxcommon import run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -66,14 +67,13 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
     wxteams_spacequery = input('Please enter part of name of space to list members of: ')
 
     # Query the Webex API for its list of spaces, webexpythonsdk abstracts most of the work
     # https://github.com/WebexCommunity/WebexPythonSDK/
     print('Building space list, please wait...')
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     # Populate list of query matches from full list, case insensitive
     wx_space_matchlist = list()
@@ -121,4 +121,4 @@ def main():
         print('# Complete.')
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
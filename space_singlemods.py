@@ -23,7 +23,9 @@ import os
 import sys
 
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+from webexpythonsdk import ApiError
+
+from wxcommon import SingleFlightCache, run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -45,9 +47,8 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     # validate the auth token up front (raises ApiError on a bad or expired token)
     try:
@@ -68,6 +69,9 @@ def main():
     total_spaces = len(list(space_fulllist))
     current_space = 1
 
+    # the same few people moderate many spaces; look each one up once
+    moderator_names = SingleFlightCache()
+
     for space in space_fulllist:
         print(f'Working on {current_space} of {total_spaces}: {space.title}... ')
         moderators = []
@@ -76,8 +80,9 @@ def main():
             memberships = api.memberships.list(roomId=space.id)
             for membership in memberships:
                 if membership.isModerator:
-                    moderator = api.people.get(personId=membership.personId)
-                    moderators.append(moderator.displayName)
+                    person_id = membership.personId
+                    moderators.append(moderator_names.get(
+                        person_id, lambda: api.people.get(personId=person_id).displayName))
             if len(moderators) == 1:
                 space_matchlist.append([space.title, moderators[0]])
         else:
@@ -87,4 +92,4 @@ def main():
     print(space_matchlist)
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -22,19 +22,49 @@ spreadsheet of spaces you have the id for. The team column is blank for a standa
 team-backed space, and shows "(not a member)" when the space belongs to a team you cannot read
 (e.g. you are not a member of it).
 
-Usage: space_summary.py [-n|--no-members] [--stdin] <space_id> [<space_id> ...]
+Usage: space_summary.py [-n|--no-members] [--members-cap N] [--members-estimate] [--moderators]
+                        [--external] [--monitors] [--jsonl] [--stdin] <space_id> [<space_id> ...]
   <space_id>         a base64 room identifier from Control Hub / the Webex API.
-  --stdin (or -)     also read space ids from stdin, one per line (blank lines ignored).
+  --stdin (or -)     also read space ids from stdin, one per line (blank lines ignored); a line
+                     may instead be a JSONL record from another tool's --jsonl output.
   -n / --no-members  skip the member count.
+  --members-cap N    stop counting a space's members past N and show "N+" (the other counts
+                     then cover only the members seen, and are shown with a "+" too).
+  --members-estimate count members from the number of membership pages, decoding only the last.
+  --moderators       add a column counting the space's moderators.
+  --external         add a column counting members from other orgs than yours (by personOrgId).
+  --monitors         add a column counting the space's monitors.
+  --jsonl            write one JSON record per space instead of CSV.
 
 Space ids can be given as arguments, piped in via --stdin, or both -- use --stdin for hundreds
 of ids, since a long argument list is awkward and hits command-line length limits. For example:
   Get-Content ids.txt | python space_summary.py --stdin
-  python user_sharedspaces.py someone@example.com | ... | python space_summary.py --stdin
+  python user_sharedspaces.py --jsonl someone@example.com | python space_summary.py --stdin
+
+Piped JSONL records are used as they stand: a record that already carries the room's title,
+isLocked and lastActivity (as user_sharedspaces.py --jsonl emits) is summarized without
+fetching the room again, and only what is missing is looked up.
 
 The title and last-activity come from a single fast room lookup. The member count, however,
 requires listing every membership in the space, which for very large spaces (or many spaces at
-once) can be slow -- pass -n / --no-members to skip it and leave that column blank.
+once) can be slow -- pass -n / --no-members to skip it and leave that column blank. Up to WORKERS
+spaces are looked up at once; rows are still written in input order, each as soon as it and
+every row before it is ready. The optional moderator, external and monitor counts are tallied
+in that same membership listing (fetched MEMBERSHIP_PAGE_SIZE at a time, the most the API
+returns per page), so adding any of them costs no extra calls. For triage across thousands of
+spaces, --members-cap N keeps a useful size column while never reading more than one page of
+N + 1 members (or N / MEMBERSHIP_PAGE_SIZE pages) per space. Webex pages listings by cursor, so
+a count can't skip pages; --members-estimate still fetches each page but takes every page but the
+last as full rather than decoding its thousand members -- a close count at less client-side cost.
+It can't be combined with the per-member counts, which need every member decoded.
+
+When many ids are given, most are often spaces you belong to, and one page of your own room
+listing holds up to LIST_PAGE_SIZE of them. So bare ids are gathered in batches of up to
+LOOKUP_BATCH and your room listing is paged for each batch for as long as that can still save
+calls (more ids outstanding than pages read); only the leftovers are looked up one by one.
+Team names are joined the same way from your team listing, with per-team lookups only for
+teams it doesn't hold. Complete piped rooms need no lookup and go straight through, so output
+keeps pace with a tool piping them in.
 
 CSV is written to stdout; per-space warnings go to stderr, so output can be redirected cleanly.
 
@@ -45,38 +75,214 @@ import os
 import sys
 
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+from webexpythonsdk import ApiError
+
+from wxcommon import (WORKERS, SingleFlightCache, concurrent_map, emit_record, list_json,
+                      list_pages, parse_record, record_target, run_main, webex_api)
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
 # i.e. c:\users\jsmith\Personal-Local\config.yml
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.yml")
 
-USAGE = 'Usage: space_summary.py [-n|--no-members] [--stdin] <space_id> [<space_id> ...]'
+USAGE = ('Usage: space_summary.py [-n|--no-members] [--members-cap N] [--members-estimate] '
+         '[--moderators] [--external] [--monitors] [--jsonl] [--stdin] <space_id> [<space_id> ...]')
+
+# a piped record holding all of these is a complete room listing entry; teamId is only present
+# on team spaces, so its absence is meaningful rather than missing
+ROOM_FIELDS = ('title', 'isLocked', 'lastActivity')
+
+# the largest page the rooms and teams listings return
+LIST_PAGE_SIZE = 1000
+
+# most bare ids held back at once to be joined against the listings together
+LOOKUP_BATCH = 1000
+
+# the largest page the memberships listing returns
+MEMBERSHIP_PAGE_SIZE = 1000
+
+# optional columns tallied in the member count's membership pass: flag -> (CSV header, JSON key)
+MEMBER_METRICS = {'--moderators': ('moderators', 'moderatorCount'),
+                  '--external': ('external', 'externalCount'),
+                  '--monitors': ('monitors', 'monitorCount')}
 
 def warn(message):
     """emit a warning to stderr so it never pollutes the CSV on stdout"""
     print(message, file=sys.stderr, flush=True)
 
-def member_count(space_id, api):
-    """count the members of a space, or a placeholder if the listing can't be retrieved"""
+def membership_stats(space_id, my_org, cap, api):
+    """tally members, moderators, other-org members and monitors in one membership listing
+
+    Returns a dict keyed like the JSON output (memberCount, moderatorCount, ...), holding a
+    placeholder for each if the listing can't be retrieved. Given a cap, the listing stops once
+    more than cap members are seen and every count is returned as a lower bound, e.g. '500+'.
+    """
+    stats = dict.fromkeys(['memberCount'] + [key for _, key in MEMBER_METRICS.values()], 0)
+    # with a small cap, one page just big enough to tell "over the cap" answers it
+    page_size = min(MEMBERSHIP_PAGE_SIZE, cap + 1) if cap else MEMBERSHIP_PAGE_SIZE
+    try:
+        for member in list_json(api, 'memberships', roomId=space_id, max=page_size):
+            if cap and stats['memberCount'] == cap:
+                stats = {key: f'{count}+' for key, count in stats.items()}
+                break
+            stats['memberCount'] += 1
+            if member.get('isModerator'):
+                stats['moderatorCount'] += 1
+            if member.get('isMonitor'):
+                stats['monitorCount'] += 1
+            if member.get('personOrgId') not in (None, my_org):
+                stats['externalCount'] += 1
+    except ApiError as error:
+        warn(f'### could not list members of {space_id}: {error} ###')
+        return dict.fromkeys(stats, '(unavailable)')
+    return stats
+
+def estimate_members(space_id, cap, api):
+    """count a space's members from its membership page count, decoding only the last page
+
+    Webex fills every page of a listing but the last, so (pages - 1) x page size + the last
+    page's length is the count -- an estimate only in trusting that. Given a cap, paging stops
+    once the full pages alone pass it and 'cap+' is returned. A placeholder is returned if the
+    listing can't be retrieved.
+    """
     try:
-        return sum(1 for _ in api.memberships.list(roomId=space_id))
+        # raw requests, following the Link headers ourselves: the SDK's pager decodes each page
+        response = api._session.request('GET', 'memberships', 200,
+                                        params={'roomId': space_id, 'max': MEMBERSHIP_PAGE_SIZE})
+        full_pages = 0
+        while response.links.get('next'):
+            full_pages += 1
+            if cap and full_pages * MEMBERSHIP_PAGE_SIZE > cap:
+                return {'memberCount': f'{cap}+'}
+            response = api._session.request('GET', response.links['next']['url'], 200)
+        count = full_pages * MEMBERSHIP_PAGE_SIZE + len(response.json().get('items', []))
     except ApiError as error:
         warn(f'### could not list members of {space_id}: {error} ###')
-        return '(unavailable)'
+        return {'memberCount': '(unavailable)'}
+    return {'memberCount': f'{cap}+' if cap and count > cap else count}
 
 def team_name(team_id, api, cache):
     """resolve a team id to its name; '' if the space has no team, placeholder if unreadable"""
     if not team_id:
         return ''
-    if team_id not in cache:
+
+    def fetch():
         # a team we can't read (not a member) returns 403/404 -- report that rather than crash
         try:
-            cache[team_id] = api.teams.get(team_id).name
+            return api.teams.get(team_id).name
         except ApiError:
-            cache[team_id] = '(not a member)'
-    return cache[team_id]
+            return '(not a member)'
+
+    # many spaces share a team: the cache makes that one teams.get, even for concurrent callers
+    return cache.get(team_id, fetch)
+
+def read_spaces(arguments, read_stdin):
+    """yield (space id, piped record or None): the arguments first, then any stdin lines
+
+    A membership record's own id is the membership's, so its roomId wins (see record_target).
+    """
+    for space_id in arguments:
+        yield space_id, None
+    if read_stdin:
+        for line in sys.stdin:
+            record = parse_record(line)
+            if record is not None:
+                space_id = record_target(record, 'roomId')
+                if space_id:
+                    yield space_id, record
+            elif line.strip():
+                yield line.strip(), None
+
+def complete_room(space_id, record):
+    """True if a piped record is already the space's full room listing entry"""
+    return record is not None and record.get('id') == space_id and \
+        all(field in record for field in ROOM_FIELDS)
+
+def bulk_lookup(api, resource, wanted):
+    """page through a listing for the wanted ids; return id -> JSON for those it holds
+
+    A page is only fetched while more ids are outstanding than pages have been read: past that
+    point even a page holding every leftover would save nothing over per-id GETs. Fewer than two
+    ids are never listed for, since one GET can't be beaten.
+    """
+    found = dict()
+    outstanding = set(wanted)
+    if len(outstanding) < 2:
+        return found
+    for pages, page in enumerate(list_pages(api, resource, max=LIST_PAGE_SIZE), 1):
+        for item in page:
+            if item['id'] in outstanding:
+                found[item['id']] = item
+                outstanding.discard(item['id'])
+        if pages >= len(outstanding):
+            break
+    return found
+
+def plan_lookups(spaces, api, listed, team_cache):
+    """pass (space id, record) pairs on in input order, joining bare ids against the listings
+
+    A complete piped room goes straight on. Other ids are held back in batches of up to
+    LOOKUP_BATCH -- cut short by a complete room behind them or the end of the input -- and each
+    batch is joined against your room listing into listed, and the teams of the rooms found
+    against your team listing into team_cache, before it is passed on.
+    """
+    batch = []
+    teams_listed = set()
+
+    def flush():
+        wanted = [space_id for space_id, _ in batch]
+        try:
+            found = bulk_lookup(api, 'rooms', wanted)
+        except ApiError as error:
+            warn(f'### could not list your spaces, looking each up instead: {error} ###')
+            found = dict()
+        if found:
+            warn(f'# {len(found)} of {len(set(wanted))} spaces found in your room listing')
+        listed.update(found)
+        teams = {room.get('teamId') for room in found.values()} - teams_listed - {None}
+        teams_listed.update(teams)
+        try:
+            for team_id, team in bulk_lookup(api, 'teams', teams).items():
+                team_cache.put(team_id, team.get('name'))
+        except ApiError as error:
+            warn(f'### could not list your teams, looking each up instead: {error} ###')
+        yield from batch
+        batch.clear()
+
+    for space_id, record in spaces:
+        if complete_room(space_id, record):
+            yield from flush()
+            yield space_id, record
+        else:
+            batch.append((space_id, record))
+            if len(batch) >= LOOKUP_BATCH:
+                yield from flush()
+    yield from flush()
+
+def summarize(space_id, record, listed, counts, count_members, api, team_cache):
+    """return the room (as JSON) with teamName, moderated and the wanted counts added
+
+    count_members(space_id) returns the membership counts, keyed like the JSON output.
+
+    A piped record that is already a complete room listing entry is used as it stands, then a
+    room found by the bulk listing; anything else costs one rooms.get, whose ApiError is left
+    for the caller to report.
+    """
+    if complete_room(space_id, record):
+        room = record
+    elif space_id in listed:
+        room = listed[space_id]
+    else:
+        room = api.rooms.get(space_id).json_data
+    # isLocked is Webex's flag for a moderated space; already on the room, no extra call
+    summary = {**room,
+               'teamName': team_name(room.get('teamId'), api, team_cache),
+               'moderated': bool(room.get('isLocked')),
+               'memberCount': None}
+    if counts:
+        stats = count_members(space_id)
+        summary.update((key, stats[key]) for key in counts)
+    return summary
 
 def main():
     """summarize one or more spaces as CSV: title, member count, last activity"""
@@ -91,46 +297,97 @@ def main():
 
     # pull the optional flags out of the argument list; whatever remains is a list of space ids
     skip_members = False
+    cap = 0
+    estimate = False
+    metrics = []
     read_stdin = False
-    space_ids = []
-    for arg in sys.argv[1:]:
+    jsonl = False
+    arguments = []
+    args = iter(sys.argv[1:])
+    for arg in args:
         if arg in ('-n', '--no-members'):
             skip_members = True
+        elif arg == '--members-cap':
+            try:
+                cap = int(next(args, ''))
+            except ValueError:
+                cap = 0
+            if cap < 1:
+                print('### --members-cap needs a positive number of members ###')
+                sys.exit(1)
+        elif arg == '--members-estimate':
+            estimate = True
+        elif arg in MEMBER_METRICS:
+            if MEMBER_METRICS[arg] not in metrics:
+                metrics.append(MEMBER_METRICS[arg])
         elif arg in ('--stdin', '-'):
             read_stdin = True
+        elif arg == '--jsonl':
+            jsonl = True
         else:
-            space_ids.append(arg)
-
-    # append ids piped in one per line -- the practical way to pass hundreds of them
-    if read_stdin:
-        space_ids.extend(line.strip() for line in sys.stdin if line.strip())
+            arguments.append(arg)
 
-    if not space_ids:
+    if not arguments and not read_stdin:
         print(USAGE)
         sys.exit(1)
 
+    if estimate and metrics:
+        print('### --members-estimate can\'t be combined with --moderators, --external or '
+              '--monitors, which need every member read ###')
+        sys.exit(1)
+
     with open(CONFIG_FILE, 'r') as config_file:
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
-    team_cache = {}
-    print('"title","team","moderated","members","lastActivity","roomId"')
-    for space_id in space_ids:
+    # the JSON keys the membership pass fills in; other-org members are judged against our own org
+    counts = ([] if skip_members else ['memberCount']) + [key for _, key in metrics]
+    my_org = None
+    if MEMBER_METRICS['--external'] in metrics:
         try:
-            room = api.rooms.get(space_id)
+            my_org = api.people.me().orgId
+        except ApiError as error:
+            print(error)
+            if error.status_code == 401:
+                print('### Please check that a fresh auth_token has been specified in config '
+                      'file. ###')
+            sys.exit()
+    if estimate:
+        count_members = lambda space_id: estimate_members(space_id, cap, api)
+    else:
+        count_members = lambda space_id: membership_stats(space_id, my_org, cap, api)
+
+    # plan the lookups as the input streams in: join what the room and team listings hold,
+    # GET only the leftovers
+    listed = dict()
+    team_cache = SingleFlightCache()
+    spaces = plan_lookups(read_spaces(arguments, read_stdin), api, listed, team_cache)
+
+    if not jsonl:
+        headers = ['title', 'team', 'moderated', 'members'] + [header for header, _ in metrics]
+        print(','.join(f'"{header}"' for header in headers + ['lastActivity', 'roomId']))
+    summaries = concurrent_map(
+        lambda space: summarize(space[0], space[1], listed, counts, count_members, api, team_cache),
+        spaces, workers=WORKERS, ordered=True)
+    for (space_id, record), summary in summaries:
+        try:
+            room = summary.result()
         except ApiError as error:
             warn(f'### could not retrieve space {space_id}: {error} ###')
             continue
-        team = team_name(room.teamId, api, team_cache)
-        # isLocked is Webex's flag for a moderated space; already on the room, no extra call
-        moderated = str(bool(room.isLocked)).lower()
-        members = '' if skip_members else member_count(space_id, api)
-        print(f'"{room.title}","{team}","{moderated}","{members}","{room.lastActivity}","{room.id}"')
+        if jsonl:
+            # pass the room through with every field it arrived with, plus what was worked out
+            emit_record({**(record or {}), **room})
+        else:
+            members = '' if room['memberCount'] is None else room['memberCount']
+            extra = ''.join(f',"{room[key]}"' for _, key in metrics)
+            print(f'"{room.get("title")}","{room["teamName"]}",'
+                  f'"{str(room["moderated"]).lower()}","{members}"{extra},'
+                  f'"{room.get("lastActivity")}","{room["id"]}"', flush=True)
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
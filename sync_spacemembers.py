@@ -19,22 +19,34 @@ Prompts for a space name, then compares its members against either an AD group o
 email addresses and offers to add the missing members. AD comparisons confirm each addition
 individually; email-list comparisons add all missing members in one shot (after a single
 bulk confirmation), since a curated list is assumed to be intentional.
+
+Usage: sync_spacemembers.py [--resume <journal>]
+
+The confirmed additions are written to a journal file (named in the output) before the first is
+sent, and each is marked off as it completes. If a run is cut short, --resume <journal> carries
+on with the additions still outstanding, without repeating the comparison.
 """
 
 import itertools
 import os
 import shutil
 import sys
+from collections import namedtuple
 
 import ldap3
 import yaml
-from webexpythonsdk import WebexAPI
+
+from wxcommon import (OperationJournal, journal_path, list_json, resume_argument, run_journal,
+                      run_main, webex_api)
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
 # i.e. c:\users\jsmith\Personal-Local\config.yml
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.yml")
 
+TOOL = 'sync_spacemembers'
+USAGE = 'Usage: sync_spacemembers.py [--resume <journal>]'
+
 LDAPFILTER_GROUP = 'objectClass=group'
 
 LDAPFILTER_USER = (
@@ -48,6 +60,9 @@ LDAP_USER_ATTRIBUTES = ['displayName', 'whenCreated', 'mail']
 
 SPINNER = itertools.cycle(['-', '/', '|', '\\'])
 
+# the fields kept per space member, rather than the full membership payload
+SpaceMember = namedtuple('SpaceMember', ['email', 'name'])
+
 def input_with_default(prompt, default):
     """grab input with supplied default"""
     bck = chr(8) * len(default)
@@ -200,6 +215,14 @@ def get_emaillist_userlist():
     print(f'Loaded {len(userlist)} unique email address(es) from {email_file}.\n')
     return userlist, f'{os.path.basename(email_file)} email list'
 
+def add_member(operation, api):
+    """perform one planned addition"""
+    api.memberships.create(operation['roomId'], personEmail=operation['personEmail'])
+
+def report_failure(operation, error):
+    """report an addition that failed"""
+    print(f'### Failed to add {operation["personEmail"]}: {error}')
+
 def main():
     """sync Webex space membership against an AD group or an email-list file"""
     # Windows consoles/pipes default to cp1252, which can't encode emoji or other non-Latin-1
@@ -211,24 +234,36 @@ def main():
         except (AttributeError, ValueError):
             pass
 
+    resume_path = resume_argument(USAGE)
+
     with open(CONFIG_FILE, 'r') as config_file:
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
+
+    if resume_path:
+        try:
+            journal = OperationJournal.load(resume_path, TOOL)
+        except (OSError, ValueError) as error:
+            print(f'### Could not resume from journal: {error}')
+            sys.exit(1)
+        api = webex_api(CONFIG_FILE, wxteams_config)
+        run_journal(journal, lambda operation: add_member(operation, api),
+                    report_failure, 409)
+        print('\nComplete.')
+        return
 
     wx_spacequery = input('Please enter name of the space to examine: ')
 
     print('\nBuilding Webex space list, please wait...', end='')
-    api = WebexAPI(access_token=wxteams_token)
-    wx_space_fulllist = list(api.rooms.list(type='group'))
+    api = webex_api(CONFIG_FILE, wxteams_config)
+    # Populate list of query matches straight from the listing, case insensitive; only the
+    # matches are kept, not every space
+    wx_space_matchlist = [{'name': wx_space.get('title'), 'id': wx_space['id']}
+                          for wx_space in list_json(api, 'rooms', type='group')
+                          if wx_spacequery.upper() in (wx_space.get('title') or '').upper()]
     print_done()
 
-    # Populate list of query matches from full list, case insensitive
-    wx_space_matchlist = [{'name': wx_space.title, 'id': wx_space.id}
-                          for wx_space in wx_space_fulllist
-                          if wx_spacequery.upper() in wx_space.title.upper()]
-
     if not wx_space_matchlist:
         bad_choice()
 
@@ -263,7 +298,10 @@ def main():
     # Catalogue space members
     if confirmed(f'Webex \"{wx_space_match["name"]}\" space selected, are you sure?'):
         print(f'Gathering details on \"{wx_space_match["name"]}\" space...', end='')
-        wx_space_members = list(api.memberships.list(roomId=wx_space_match['id']))
+        wx_space_members = [SpaceMember((member.get('personEmail') or '').lower(),
+                                        member.get('personDisplayName'))
+                            for member in list_json(api, 'memberships',
+                                                    roomId=wx_space_match['id'])]
         print_done()
     else:
         bad_choice()
@@ -278,9 +316,10 @@ def main():
         confirm_each = True
 
     # Build the list of source users not already in the space
+    wx_space_emails = {wx_user.email for wx_user in wx_space_members}
     wx_space_additions = list()
     for source_user in source_userlist:
-        if any(wx_user.personEmail.lower() == source_user['email'] for wx_user in wx_space_members):
+        if source_user['email'] in wx_space_emails:
             continue
         if confirm_each:
             detail = f' ({source_user["created"]})' if source_user.get('created') else ''
@@ -295,21 +334,26 @@ def main():
         print('### No users to add to space!')
     elif confirm_each or confirmed(f'Add {len(wx_space_additions)} user(s) not currently in '
                                    f'\"{wx_space_match["name"]}\"?'):
-        for addition in wx_space_additions:
-            api.memberships.create(wx_space_match['id'], personEmail=addition)
-        print(f'Added {len(wx_space_additions)} user(s) to \"{wx_space_match["name"]}\".')
+        journal = OperationJournal.create(journal_path(TOOL),
+                                          TOOL,
+                                          [{'roomId': wx_space_match['id'], 'personEmail': addition}
+                                           for addition in wx_space_additions])
+        failures = run_journal(journal, lambda operation: add_member(operation, api),
+                               report_failure, 409)
+        print(f'Added {len(wx_space_additions) - failures} user(s) to '
+              f'\"{wx_space_match["name"]}\".')
     else:
         print('### Aborted, no users added.')
 
     print('\n')
 
     # Notify if the space includes users not present in the comparison source
+    source_emails = {source_user['email'] for source_user in source_userlist}
     for wx_user in wx_space_members:
-        if not any(source_user['email'] == wx_user.personEmail.lower()
-                   for source_user in source_userlist):
-            print(f'\"{wx_user.personDisplayName}\" not in {source_label}!')
+        if wx_user.email not in source_emails:
+            print(f'\"{wx_user.name}\" not in {source_label}!')
 
     print('\nComplete.')
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
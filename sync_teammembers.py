@@ -17,6 +17,12 @@
 """
 Prompts for a team name and an AD group, compares members, and then asks if you would like to
 add\\remove delta memberships
+
+Usage: sync_teammembers.py [--resume <journal>]
+
+The confirmed additions and removals are written to a journal file (named in the output) before
+the first is sent, and each is marked off as it completes. If a run is cut short, --resume
+<journal> carries on with the changes still outstanding, without repeating the comparison.
 """
 
 import itertools
@@ -26,13 +32,18 @@ import sys
 
 import ldap3
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+
+from wxcommon import (OperationJournal, journal_path, resume_argument, run_journal, run_main,
+                      webex_api)
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
 # i.e. c:\users\jsmith\Personal-Local\config.yml
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.yml")
 
+TOOL = 'sync_teammembers'
+USAGE = 'Usage: sync_teammembers.py [--resume <journal>]'
+
 LDAPFILTER_GROUP = 'objectClass=group'
 
 LDAPFILTER_USER = (
@@ -82,6 +93,24 @@ def print_done():
     """close off hanging status output"""
     print(' done.\n\n')
 
+def perform_operation(operation, api):
+    """perform one planned addition or removal"""
+    if operation['action'] == 'add':
+        api.team_memberships.create(operation['teamId'], personEmail=operation['personEmail'])
+    else:
+        api.team_memberships.delete(operation['id'])
+
+def report_failure(operation, error):
+    """report an addition or removal that failed"""
+    if operation['action'] == 'add':
+        print(f'### Failed to add \"{operation["personEmail"]}\": {error}')
+    else:
+        print(f'### Failed to remove \"{operation["name"]}\": {error}')
+
+def already_done_status(operation):
+    """the status an addition (409, already a member) or removal (404, gone) is done with"""
+    return 409 if operation['action'] == 'add' else 404
+
 def main():
     """sync AD and WX Teams team membership"""
     # Windows consoles/pipes default to cp1252, which can't encode emoji or other non-Latin-1
@@ -93,11 +122,24 @@ def main():
         except (AttributeError, ValueError):
             pass
 
+    resume_path = resume_argument(USAGE)
+
     with open(CONFIG_FILE, 'r') as config_file:
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
+
+    if resume_path:
+        try:
+            journal = OperationJournal.load(resume_path, TOOL)
+        except (OSError, ValueError) as error:
+            print(f'### Could not resume from journal: {error}')
+            sys.exit(1)
+        api = webex_api(CONFIG_FILE, wxteams_config)
+        run_journal(journal, lambda operation: perform_operation(operation, api),
+                    report_failure, already_done_status)
+        print('\nComplete.')
+        return
 
     ldap_config = config_params['ldap']
     ldap_host = ldap_config['server']
@@ -111,7 +153,7 @@ def main():
     wx_teamquery = input('Please enter name of the team to examine: ')
 
     print('\nBuilding Webex team list, please wait...', end='')
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
     wx_team_fulllist = list(api.teams.list())
     print_done()
 
@@ -253,11 +295,7 @@ def main():
                          f'not in \"{wx_team_match["name"]}\" team, add?'):
                 wx_team_additions.append(ad_user["email"])
 
-    # Add users selected to team
-    if wx_team_additions:
-        for addition in wx_team_additions:
-            api.team_memberships.create(wx_team_match['id'], personEmail=addition)
-    else:
+    if not wx_team_additions:
         print('### No users selected to add to team!')
 
     print('\n')
@@ -271,17 +309,20 @@ def main():
                          f'\"{wx_team_match["name"]}\" team?'):
                 wx_team_removals.append(wx_user)
 
-    # Remove users selected from team
-    if wx_team_removals:
-        for removal in wx_team_removals:
-            try:
-                api.team_memberships.delete(removal.id)
-            except ApiError as error:
-                print(f'### Failed to remove \"{removal.personDisplayName}\": {error}')
-    else:
+    if not wx_team_removals:
         print('### No users selected to remove from team!')
 
+    # Add and remove the users selected, journaling every change before the first is sent
+    operations = ([{'action': 'add', 'teamId': wx_team_match['id'], 'personEmail': addition}
+                   for addition in wx_team_additions] +
+                  [{'action': 'remove', 'id': removal.id, 'name': removal.personDisplayName}
+                   for removal in wx_team_removals])
+    if operations:
+        journal = OperationJournal.create(journal_path(TOOL), TOOL, operations)
+        run_journal(journal, lambda operation: perform_operation(operation, api),
+                    report_failure, already_done_status)
+
     print('\nComplete.')
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
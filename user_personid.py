@@ -34,7 +34,9 @@ import re
 import sys
 
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+from webexpythonsdk import ApiError
+
+from wxcommon import run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -124,10 +126,9 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     # validate the auth token up front (raises ApiError on a bad or expired token)
     try:
@@ -175,4 +176,4 @@ def main():
     print(person_id)
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -32,13 +32,18 @@ import sys
 
 import requests
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+from webexpythonsdk import ApiError
+
+from wxcommon import run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
 # i.e. c:\users\jsmith\Personal-Local\config.yml
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.yml")
 
+# bytes read from the avatar download at a time (see bench_download.py)
+CHUNK_SIZE = 262144
+
 def valid_smtp(email):
     """check if email is valid URI syntax"""
     regex_check = r'^\w+([\.-]?\w+)*@\w+([\.-]?\w+)*(\.\w{2,})+$'
@@ -79,10 +84,9 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     if len(sys.argv) >= 2:
         identifier = sys.argv[1].strip()
@@ -103,11 +107,11 @@ def main():
     response = requests.get(user['avatar'], stream=True)
     if response.status_code == 200:
         with open(filename, 'wb') as file:
-            for chunk in response.iter_content(1024):
+            for chunk in response.iter_content(CHUNK_SIZE):
                 file.write(chunk)
         print(f'Saved avatar to {filename}')
     else:
         print(f'### failed to download avatar: HTTP {response.status_code} ###')
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
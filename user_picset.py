@@ -36,7 +36,9 @@ import sys
 
 import requests
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+from webexpythonsdk import ApiError
+
+from wxcommon import run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -114,10 +116,9 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     # validate the auth token up front (raises ApiError on a bad or expired token)
     try:
@@ -171,4 +172,4 @@ def main():
     print(f'Avatar updated for {person.get("displayName")} ({user_email}).')
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
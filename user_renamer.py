@@ -26,7 +26,9 @@ import re
 import sys
 
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+from webexpythonsdk import ApiError
+
+from wxcommon import run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -118,13 +120,12 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
 
 
     # Query Webex API for its list of users, webexpythonsdk abstracts most of the work
     # https://github.com/WebexCommunity/WebexPythonSDK/
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
     print('Gathering org and admin information, please wait...')
 
     # Grab our personId, we'll need it later
@@ -208,4 +209,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
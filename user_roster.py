@@ -25,9 +25,11 @@ import os
 import shutil
 import sys
 import time
+from collections import namedtuple
 
 import yaml
-from webexpythonsdk import WebexAPI
+
+from wxcommon import list_json, read_ahead, run_main, webex_api
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
@@ -42,6 +44,9 @@ SPINNER = itertools.cycle(['-', '/', '|', '\\'])
 PAGE_SIZE = 500
 SLEEPER = 3
 
+# the few fields kept per user -- a tuple rather than the full person payload, for big orgs
+RosterEntry = namedtuple('RosterEntry', ['name', 'email', 'created'])
+
 def print_status(text, linefeed=0):
     """output status line"""
     text = f'{next(SPINNER)} {text}'
@@ -71,12 +76,11 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
     # optional: query a specific org by id, only applied when set in config.yml
     org_id = wxteams_config.get('org_id')
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     # Populate list of query matches from full list, case insensitive
     roles, role_users = dict(), dict()
@@ -94,21 +98,23 @@ def main():
     if org_id:
         people_query['orgId'] = org_id
 
-    for user in api.people.list(**people_query):
-        print_status(f'Grabbing list of users: {user.displayName}')
-        if user.roles:
-            for role in user.roles:
-                role_users[roles[role]].append({'name': user.displayName, 'email':user.emails[0], "created": user.created})
+    # the next page of people is fetched in the background while this one is bucketed
+    for user in read_ahead(list_json(api, 'people', **people_query), page_size=PAGE_SIZE):
+        print_status(f'Grabbing list of users: {user.get("displayName")}')
+        entry = RosterEntry(user.get('displayName'), user['emails'][0], user.get('created'))
+        if user.get('roles'):
+            for role in user['roles']:
+                role_users[roles[role]].append(entry)
         else:
-            role_users["non-admin"].append({'name': user.displayName, 'email':user.emails[0], "created": user.created})
+            role_users["non-admin"].append(entry)
 
     print_status('Finished querying users.', linefeed=2)
 
     for role, people in role_users.items():
         print(f'**{role}:**')
         for person in people:
-            print(f'* {person["name"]} ({person["email"]}) [{person["created"]}]')
+            print(f'* {person.name} ({person.email}) [{person.created}]')
         print()
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
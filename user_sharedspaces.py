@@ -21,23 +21,56 @@ spaces are reported; the CSV "type" column distinguishes them.
 
 Webex only permits an unscoped per-person membership query for a Compliance Officer, so this tool
 takes the everyday-token route instead: it walks every space you belong to and, for each, runs a
-room-scoped membership check for the target user. That needs no elevated privilege, but because a
-busy account can belong to thousands of spaces it can take several minutes. Progress is written to
-stderr; the CSV result is written to stdout, so output can be redirected cleanly.
+room-scoped membership check for the target user. That needs no elevated privilege, but a busy
+account can belong to thousands of spaces, so up to WORKERS checks run at once, fed from the room
+listing while it is still paging; a large account then takes as long as the rate limit allows
+rather than thousands of back-to-back round trips. Progress is written to stderr; the CSV result
+is written to stdout (in room listing order), so output can be redirected cleanly.
+
+A 1:1 direct space can only be shared with the target if it is the one space whose title -- for a
+direct space, the other party's display name -- matches the target's. So once the target's
+displayName is resolved, only direct spaces with that title are verified; group spaces are all
+checked. If the target can't be resolved (e.g. a guest), every direct space is checked as before.
+
+A single-target scan is saved under STATE_DIR (one file per you/target pair) with its result, the
+high-water lastActivity of the rooms listed and the scan time. The next run for the same target
+only re-checks rooms with activity since then (a membership change counts as activity) and rooms
+that are new to the listing; every other room carries its saved answer forward, so a weekly
+re-check costs the room listing plus a handful of membership queries.
+
+Usage: user_sharedspaces.py [--jsonl] [--full] [--top N] [<other_user_email> ...]
+  --jsonl  instead of CSV, write each shared space to stdout as a JSON record (the full room
+           listing entry) the moment it is found, ready to pipe into space_summary.py --stdin.
+  --full   ignore any saved scan for the target and check every room again.
+  --top N  also rank the N people you share the most spaces with.
+
+Given several emails (or --top), the scan switches to index mode: rather than one targeted check
+per room per person, it lists each room's full membership once and builds an in-memory index of
+person -> shared rooms, then answers every target from it -- N rooms x 1 listing instead of
+N rooms x T targets queries. The CSV then gains a leading "email" column naming the target.
 """
 
+import json
 import os
 import re
 import sys
+from collections import defaultdict
+from datetime import datetime, timezone
 
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+from webexpythonsdk import ApiError
+
+from wxcommon import (WORKERS, concurrent_map, emit_record, list_json, read_ahead, run_main,
+                      webex_api)
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
 # i.e. c:\users\jsmith\Personal-Local\config.yml
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.yml")
 
+# where each target's last single-target scan is kept for the next incremental run
+STATE_DIR = os.path.join(os.path.expanduser('~'), "Personal-Local", "sharedspaces")
+
 def progress(message):
     """emit a progress/status line to stderr so it never pollutes the CSV on stdout"""
     print(message, file=sys.stderr, flush=True)
@@ -59,6 +92,115 @@ def shares_space(room_id, target_id, target_email, api):
         members = api.memberships.list(roomId=room_id, personEmail=target_email)
     return bool(list(members))
 
+def needs_check(room, target_name):
+    """False for a direct space that can't be the target's: its title names someone else"""
+    if room.type != 'direct' or not target_name:
+        return True
+    return (room.title or '').strip().casefold() == target_name
+
+def state_path(my_email, target_email):
+    """return the saved-scan file for a (you, target) pair"""
+    name = re.sub(r'[^\w.@-]', '_', f'{my_email}--{target_email}'.lower())
+    return os.path.join(STATE_DIR, f'{name}.json')
+
+def load_state(path):
+    """return (cutoff, roomId -> shared) from a saved scan, or (None, {}) if there isn't one
+
+    The cutoff is the earlier of the scan's high-water lastActivity and its own start time, so
+    neither a skewed local clock nor activity landing mid-scan can hide a changed room.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as state_file:
+            state = json.load(state_file)
+        cutoff = datetime.fromisoformat(state['scanned'])
+        if state.get('highWater'):
+            cutoff = min(cutoff, datetime.fromisoformat(state['highWater']))
+        return cutoff, state['rooms']
+    except FileNotFoundError:
+        return None, {}
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        progress(f'### Ignoring unreadable saved scan {path}: {error} ###')
+        return None, {}
+
+def save_state(path, target_email, scanned, high_water, results):
+    """write a scan's results for the next incremental run (atomically, like the config file)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    state = {'target': target_email,
+             'scanned': scanned.isoformat(),
+             'highWater': high_water.isoformat() if high_water else None,
+             'rooms': results}
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, path)
+
+def unchanged(room, cutoff, saved):
+    """True if a room has a saved answer and no activity since the saved scan"""
+    return (cutoff is not None and room.id in saved and room.lastActivity is not None
+            and room.lastActivity < cutoff)
+
+def room_members(room_id, api):
+    """return (lowercased email, display name) for every member of a room"""
+    return [((member.get('personEmail') or '').lower(), member.get('personDisplayName'))
+            for member in list_json(api, 'memberships', roomId=room_id)]
+
+def index_spaces(api, my_email):
+    """list every room's membership once; return (rooms, email -> room positions, email -> name)
+
+    Rooms are checked WORKERS at a time while the room listing is still paging. A room whose
+    membership can't be listed is reported and left out, as in the single-target scan.
+    """
+    rooms = []
+    shared_rooms = defaultdict(list)
+    names = dict()
+    listings = concurrent_map(lambda room: room_members(room.id, api),
+                              read_ahead(api.rooms.list()), workers=WORKERS)
+    for room, listing in listings:
+        position = len(rooms)
+        rooms.append(room)
+        try:
+            for email, name in listing.result():
+                if email and email != my_email:
+                    shared_rooms[email].append(position)
+                    names[email] = name
+        except ApiError as error:
+            progress(f'  ### skipped a space ({room.id}): {error} ###')
+        if len(rooms) % 100 == 0:
+            progress(f'  ...{len(rooms)} spaces indexed, {len(shared_rooms)} people seen so far')
+    progress(f'# done: indexed {len(rooms)} spaces, {len(shared_rooms)} people share at least one')
+    return rooms, shared_rooms, names
+
+def report_index(targets, top, jsonl, api, me):
+    """index-mode scan: answer every target email (and the --top ranking) from one pass"""
+    my_email = me.emails[0].lower()
+    progress(f'# indexing every space {me.emails[0]} belongs to -- this can take a while...')
+    rooms, shared_rooms, names = index_spaces(api, my_email)
+
+    if targets:
+        if not jsonl:
+            print('"email","title","type","roomId"')
+        for target in targets:
+            positions = shared_rooms.get(target.lower(), [])
+            progress(f'# {target}: {len(positions)} shared space(s)')
+            for position in sorted(positions):
+                room = rooms[position]
+                if jsonl:
+                    emit_record({'targetEmail': target, **room.json_data})
+                else:
+                    print(f'"{target}","{room.title}","{room.type}","{room.id}"')
+
+    if top:
+        ranking = sorted(shared_rooms.items(), key=lambda entry: (-len(entry[1]), entry[0]))[:top]
+        if not jsonl:
+            print(f'\nTop {len(ranking)} co-member(s) of {me.emails[0]} by shared spaces:\n')
+            print('"rank","name","email","sharedSpaces"')
+        for rank, (email, positions) in enumerate(ranking, 1):
+            if jsonl:
+                emit_record({'rank': rank, 'personDisplayName': names.get(email),
+                             'personEmail': email, 'sharedSpaces': len(positions)})
+            else:
+                print(f'"{rank}","{names.get(email)}","{email}","{len(positions)}"')
+
 def main():
     """list every space the token's own identity shares with a given other user"""
     # Windows consoles/pipes default to cp1252, which can't encode emoji or other non-Latin-1
@@ -74,10 +216,9 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work
-    api = WebexAPI(access_token=wxteams_token)
+    api = webex_api(CONFIG_FILE, wxteams_config)
 
     # validate the auth token up front and capture our own identity (raises on a bad/expired token)
     try:
@@ -88,14 +229,37 @@ def main():
             print('### Please check that a fresh auth_token has been specified in config file. ###')
         sys.exit()
 
-    if len(sys.argv) == 1:
-        other_email = input('Please enter the email address of the other user: ')
-    else:
-        other_email = str(sys.argv[1])
+    jsonl = False
+    full = False
+    top = 0
+    targets = []
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg == '--jsonl':
+            jsonl = True
+        elif arg == '--full':
+            full = True
+        elif arg == '--top':
+            try:
+                top = int(next(args, ''))
+            except ValueError:
+                print('### --top needs a number of people to rank ###')
+                return
+        else:
+            targets.append(arg)
+
+    if not targets and not top:
+        targets.append(input('Please enter the email address of the other user: '))
+
+    if not all(valid_smtp(target) for target in targets):
+        return
 
-    if not valid_smtp(other_email):
+    if len(targets) > 1 or top:
+        report_index(targets, top, jsonl, api, me)
         return
 
+    other_email = targets[0]
+
     # resolve the target to a personId when possible: it makes each per-room check unambiguous and
     # catches an obvious typo before we commit to a multi-minute scan. External/guest users may not
     # resolve, so we warn and fall back to matching by email rather than aborting.
@@ -103,37 +267,88 @@ def main():
     if matches:
         target = matches[0]
         target_id = target.id
+        target_name = (target.displayName or '').strip().casefold()
         progress(f'# target: {target.displayName} <{other_email}>')
     else:
         target_id = None
+        target_name = None
         progress(f'### {other_email} not found in the directory; matching by email address. '
                  'If it is mistyped, the scan will simply find nothing. ###')
 
+    saved_path = state_path(me.emails[0], other_email)
+    cutoff, saved = (None, {}) if full else load_state(saved_path)
+    if cutoff:
+        progress(f'# re-checking only spaces new or active since {cutoff:%Y-%m-%d %H:%M} UTC')
     progress(f'# scanning every space {me.emails[0]} belongs to -- this can take a while...')
 
+    started = datetime.now(timezone.utc)
     shared = []
+    results = dict()
+    high_water = None
     scanned = 0
-    for room in api.rooms.list():
+    carried = 0
+    passed_over = 0
+
+    def found(position, room):
+        """record a shared room, streaming it straight out in --jsonl mode"""
+        shared.append((position, room))
+        if jsonl:
+            # streamed as found, so a downstream tool works in parallel with the scan
+            emit_record(room.json_data)
+
+    def candidates():
+        """the listed rooms worth a membership check, each with its listing position"""
+        nonlocal high_water, carried, passed_over
+        for position, room in enumerate(read_ahead(api.rooms.list())):
+            if room.lastActivity and (high_water is None or room.lastActivity > high_water):
+                high_water = room.lastActivity
+            if unchanged(room, cutoff, saved):
+                carried += 1
+                results[room.id] = saved[room.id]
+                if saved[room.id]:
+                    found(position, room)
+            elif needs_check(room, target_name):
+                yield position, room
+            else:
+                passed_over += 1
+
+    # keep the room listing paging in the background while its rooms are checked in parallel;
+    # results arrive in completion order, so each room carries its listing position for the CSV
+    rooms = candidates()
+    checks = concurrent_map(lambda entry: shares_space(entry[1].id, target_id, other_email, api),
+                            rooms, workers=WORKERS)
+    for (position, room), check in checks:
         scanned += 1
         try:
-            if shares_space(room.id, target_id, other_email, api):
-                shared.append(room)
+            results[room.id] = check.result()
+            if results[room.id]:
+                found(position, room)
                 progress(f'  match: {room.title}')
         except ApiError as error:
+            # left out of the saved results, so the next run checks it again
             progress(f'  ### skipped a space ({room.id}): {error} ###')
         if scanned % 100 == 0:
             progress(f'  ...{scanned} spaces scanned, {len(shared)} shared so far')
 
-    progress(f'# done: scanned {scanned} spaces, found {len(shared)} shared with {other_email}')
+    save_state(saved_path, other_email, started, high_water, results)
+
+    progress(f'# done: scanned {scanned} spaces (carried {carried} unchanged forward and passed '
+             f'over {passed_over} direct spaces with another name), found {len(shared)} shared '
+             f'with {other_email}')
+
+    if jsonl:
+        return
 
     if not shared:
         print(f'No spaces shared between {me.emails[0]} and {other_email}.')
         return
 
+    shared = [room for _, room in sorted(shared, key=lambda match: match[0])]
+
     print(f'\n{me.emails[0]} shares {len(shared)} space(s) with {other_email}:\n')
     print('"title","type","roomId"')
     for room in shared:
         print(f'"{room.title}","{room.type}","{room.id}"')
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
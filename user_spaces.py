@@ -23,20 +23,47 @@ of) for a Compliance Officer, so this tool uses two tokens from config.yml: the
 wxteams.auth_token for the email-to-user lookup, and wxteams.auth_token_compliance -- which must
 belong to a Webex Compliance Officer (spark-compliance:memberships_read and
 spark-compliance:rooms_read) -- for listing the user's memberships and reading space details.
+
+Space details are read WORKERS rooms at a time, and each room's title and type is kept in
+ROOM_CACHE_FILE for ROOM_CACHE_DAYS, so a re-run (or a run for a colleague in the same spaces)
+only reads rooms it hasn't seen lately. Rows are still written in membership listing order.
+
+Usage: user_spaces.py [--jsonl] [--no-titles] [--stdin] [<user_email> ...]
+  --jsonl      instead of CSV, write each membership to stdout as a JSON record (the membership's
+               own fields plus the space's title and type), ready to pipe into space_summary.py
+               --stdin.
+  --no-titles  skip reading the spaces altogether: the type comes from the membership record and
+               the title is left blank -- one listing call however many spaces there are.
+  --stdin      also read user emails from stdin, one per line; a line may instead be a JSONL
+               record carrying personEmail or email.
+
+Given several users, their memberships are listed WORKERS users at a time and the spaces they
+belong to are read in one combined pass, so a space the users have in common is read once
+rather than once per user. The CSV then gains a leading "email" column: one row per (user,
+space).
 """
 
+import json
 import os
 import re
 import sys
+from datetime import date, timedelta
 
 import yaml
-from webexpythonsdk import WebexAPI, ApiError
+from webexpythonsdk import ApiError
+
+from wxcommon import (WORKERS, concurrent_map, emit_record, list_json, parse_record, run_main,
+                      webex_api)
 
 # specifies separate config file containing non-portable parameters
 # looks for a YAML file in the user's home directory under the subfolder "Personal-Local"
 # i.e. c:\users\jsmith\Personal-Local\config.yml
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "config.yml")
 
+# room titles and types read on earlier runs, reused for ROOM_CACHE_DAYS before being read again
+ROOM_CACHE_FILE = os.path.join(os.path.expanduser('~'), "Personal-Local", "room_cache.json")
+ROOM_CACHE_DAYS = 7
+
 def valid_smtp(email):
     """check if email is valid URI syntax"""
     regex_check = r'^\w+([\.-]?\w+)*@\w+([\.-]?\w+)*(\.\w{2,})+$'
@@ -49,19 +76,70 @@ def get_user(email, api):
     """return Webex user(s) matching an email"""
     return list(api.people.list(email=email))
 
-def room_info(room_id, api):
-    """return a room's (title, type), or placeholders if it can't be retrieved"""
+def load_room_cache():
+    """return roomId -> [title, type, date read] from ROOM_CACHE_FILE, less stale entries"""
+    try:
+        with open(ROOM_CACHE_FILE, 'r', encoding='utf-8') as cache_file:
+            rooms = json.load(cache_file)
+    except FileNotFoundError:
+        return dict()
+    except (OSError, ValueError) as error:
+        print(f'### Ignoring unreadable room cache {ROOM_CACHE_FILE}: {error} ###', file=sys.stderr)
+        return dict()
+    if not isinstance(rooms, dict):
+        print(f'### Ignoring unreadable room cache {ROOM_CACHE_FILE} ###', file=sys.stderr)
+        return dict()
+    oldest = (date.today() - timedelta(days=ROOM_CACHE_DAYS)).isoformat()
+    # a malformed (e.g. hand-edited) entry is dropped, and the room read afresh
+    return {room_id: entry for room_id, entry in rooms.items()
+            if isinstance(entry, list) and len(entry) == 3 and isinstance(entry[2], str)
+            and entry[2] >= oldest}
+
+def save_room_cache(rooms):
+    """write the room cache back (atomically, so an interrupted write can't corrupt it)"""
+    temp_path = ROOM_CACHE_FILE + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump(rooms, cache_file, ensure_ascii=False)
+    os.replace(temp_path, ROOM_CACHE_FILE)
+
+def read_emails(arguments, read_stdin):
+    """return the user emails given as arguments, then any read from stdin"""
+    emails = list(arguments)
+    if read_stdin:
+        for line in sys.stdin:
+            record = parse_record(line)
+            if record is not None:
+                email = record.get('personEmail') or record.get('email')
+                if email:
+                    emails.append(email)
+            elif line.strip():
+                emails.append(line.strip())
+    return emails
+
+def user_memberships(person_id, compliance_api):
+    """return a user's memberships as raw JSON"""
+    return list(list_json(compliance_api, 'memberships', personId=person_id))
+
+def room_info(room_id, api, saved):
+    """return a room's (title, type), or placeholders if it can't be retrieved
+
+    saved is the persistent room cache: a fresh entry there is used without a call, and every
+    room read is added to it (a failed read isn't, so it is tried again next run).
+    """
     # some membership records come back without a roomId; don't hand None to the SDK (it raises)
     if not room_id:
         return '(no room id on membership)', ''
+    if room_id in saved:
+        return tuple(saved[room_id][:2])
     try:
         room = api.rooms.get(room_id)
-        return room.title, room.type
     except ApiError:
         return '(unable to retrieve title)', ''
+    saved[room_id] = [room.title, room.type, date.today().isoformat()]
+    return room.title, room.type
 
 def main():
-    """list every space a given user belongs to"""
+    """list every space one or more given users belong to"""
     # Windows consoles/pipes default to cp1252, which can't encode emoji or other non-Latin-1
     # characters in Webex-supplied text (space titles, display names) -- force UTF-8 so output
     # never dies with a UnicodeEncodeError.
@@ -75,16 +153,13 @@ def main():
         config_params = yaml.safe_load(config_file)
 
     wxteams_config = config_params['wxteams']
-    wxteams_token = wxteams_config['auth_token']
-    # compliance-scoped calls (listing another user's memberships, reading rooms we're not in)
-    # need a separate Webex Compliance Officer token
-    compliance_token = wxteams_config['auth_token_compliance']
 
     # https://github.com/WebexCommunity/WebexPythonSDK/ abstracts most of the work.
     # api: everyday admin token for ordinary people lookups.
-    # compliance_api: Compliance Officer token, used only for the compliance-scoped calls.
-    api = WebexAPI(access_token=wxteams_token)
-    compliance_api = WebexAPI(access_token=compliance_token)
+    # compliance_api: Compliance Officer token (auth_token_compliance), used only for the
+    # compliance-scoped calls -- listing another user's memberships, reading rooms we're not in.
+    api = webex_api(CONFIG_FILE, wxteams_config)
+    compliance_api = webex_api(CONFIG_FILE, wxteams_config, token_key='auth_token_compliance')
 
     # validate the everyday auth token up front (raises ApiError on a bad or expired token)
     try:
@@ -95,40 +170,88 @@ def main():
             print('### Please check that a fresh auth_token has been specified in config file. ###')
         sys.exit()
 
-    if len(sys.argv) == 1:
-        user_email = input('Please enter the email address of the target user: ')
-    else:
-        user_email = str(sys.argv[1])
+    flags = ('--jsonl', '--no-titles', '--stdin')
+    jsonl = '--jsonl' in sys.argv[1:]
+    titles = '--no-titles' not in sys.argv[1:]
+    read_stdin = '--stdin' in sys.argv[1:]
+    # a user named twice is only listed once
+    emails = list(dict.fromkeys(read_emails([arg for arg in sys.argv[1:] if arg not in flags],
+                                            read_stdin)))
 
-    if not valid_smtp(user_email):
-        return
+    if not emails and not read_stdin:
+        emails.append(input('Please enter the email address of the target user: '))
 
-    users = get_user(user_email, api)
-    if not users:
-        print('### no matching users found with that email address ###')
+    if not all(valid_smtp(email) for email in emails):
         return
 
-    user = users[0]
+    bulk = len(emails) > 1
+    # in bulk or JSONL output, notes go to stderr so stdout stays one CSV/JSONL stream
+    notes = sys.stderr if jsonl or bulk else None
+    any_failure = False
 
-    try:
-        memberships = list(compliance_api.memberships.list(personId=user.id))
-    except ApiError as error:
-        if error.status_code == 403:
-            print("### Forbidden: listing another user's spaces requires auth_token_compliance "
-                  "to be a Webex Compliance Officer token (spark-compliance:memberships_read). ###")
-        else:
-            print(f'### Failed to list memberships: {error} ###')
-        sys.exit(1)
+    # look every user up with the everyday token, several at once
+    person_ids = {}
+    for email, lookup in concurrent_map(lambda email: get_user(email, api), emails,
+                                        workers=WORKERS, ordered=True):
+        try:
+            users = lookup.result()
+        except ApiError as error:
+            print(f'### Failed to look up {email}: {error} ###', file=sys.stderr)
+            any_failure = True
+            continue
+        if not users:
+            print(f'### no matching users found with email address {email} ###', file=notes)
+            continue
+        person_ids[email] = users[0].id
 
-    if not memberships:
-        print(f'{user_email} is not a member of any spaces.')
-        return
+    # then list their memberships with the Compliance Officer token
+    listings = []
+    for email, listing in concurrent_map(
+            lambda email: user_memberships(person_ids[email], compliance_api),
+            person_ids, workers=WORKERS, ordered=True):
+        try:
+            listings.append((email, listing.result()))
+        except ApiError as error:
+            if error.status_code == 403:
+                print("### Forbidden: listing another user's spaces requires "
+                      "auth_token_compliance to be a Webex Compliance Officer token "
+                      "(spark-compliance:memberships_read). ###")
+                sys.exit(1)
+            print(f'### Failed to list memberships of {email}: {error} ###', file=sys.stderr)
+            any_failure = True
+
+    # read each distinct space once, however many of the users belong to it
+    if titles:
+        saved = load_room_cache()
+        room_ids = dict.fromkeys(membership.get('roomId')
+                                 for _, memberships in listings for membership in memberships)
+        lookups = concurrent_map(lambda room_id: room_info(room_id, compliance_api, saved),
+                                 room_ids, workers=WORKERS)
+        rooms = {room_id: lookup.result() for room_id, lookup in lookups}
+        save_room_cache(saved)
 
-    print(f'\n{user_email} is a member of {len(memberships)} space(s):\n')
-    print('"title","type","roomId"')
-    for membership in memberships:
-        title, room_type = room_info(membership.roomId, compliance_api)
-        print(f'"{title}","{room_type}","{membership.roomId}"')
+    if bulk and not jsonl:
+        print('"email","title","type","roomId"')
+    for user_email, memberships in listings:
+        if not memberships:
+            print(f'{user_email} is not a member of any spaces.', file=notes)
+            continue
+        if not jsonl and not bulk:
+            print(f'\n{user_email} is a member of {len(memberships)} space(s):\n')
+            print('"title","type","roomId"')
+        for membership in memberships:
+            room_id = membership.get('roomId')
+            # without titles, the membership record carries the room's type
+            title, room_type = rooms[room_id] if titles else ('', membership.get('roomType', ''))
+            if jsonl:
+                emit_record({**membership, 'title': title, 'type': room_type})
+            elif bulk:
+                print(f'"{user_email}","{title}","{room_type}","{room_id}"')
+            else:
+                print(f'"{title}","{room_type}","{room_id}"')
+
+    if any_failure:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
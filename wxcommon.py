@@ -0,0 +1,539 @@
+# Copyright (C) 2026 Frederick W. Nielsen
+#
+# This file is part of Cisco Collaboration Cloud Tools.
+#
+# Cisco Collaboration Cloud Tools is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Cisco Collaboration Cloud Tools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Cisco Collaboration Cloud Tools.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Helpers shared by the scripts in this folder. Not a tool in its own right -- each script imports
+only what it needs, and must be run from (or have on its path) the folder this file lives in.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import queue
+import re
+import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+# how many pages of a listing may be fetched ahead of the consumer
+READ_AHEAD_PAGES = 2
+# the page size assumed when a caller doesn't say; matches the SDK's default for most listings
+DEFAULT_PAGE_SIZE = 100
+
+# default number of API calls a tool keeps in flight at once
+WORKERS = 8
+
+# how many recent lookup results a SingleFlightCache keeps by default
+LOOKUP_CACHE_SIZE = 4096
+
+# refresh an OAuth access token this long before it is due to expire
+TOKEN_REFRESH_MARGIN = timedelta(minutes=10)
+
+# how many functions --profile lists, by self time
+PROFILE_TOP = 25
+
+# serializes TokenRefresher writes to the config file, which several refreshers may share
+_CONFIG_LOCK = threading.Lock()
+
+# sentinel marking the end of a read-ahead stream
+_DONE = object()
+
+def read_ahead(items, pages=READ_AHEAD_PAGES, page_size=DEFAULT_PAGE_SIZE):
+    """yield from an SDK list generator while its next page(s) are fetched in the background
+
+    The SDK only requests the next Link-header page once the current one has been consumed, so a
+    loop that does real work per item alternates between waiting on the network and processing.
+    Here a worker thread drains the generator into a queue holding at most `pages` pages worth of
+    items, so the following page is already in flight while this one is processed. The objects
+    and their order are unchanged; an ApiError raised while paging is re-raised to the consumer.
+    """
+    buffer = queue.Queue(maxsize=max(1, pages) * max(1, page_size))
+    stop = threading.Event()
+
+    def put(item):
+        # poll so an abandoned consumer (break, exception) never leaves the worker blocked forever
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception as error:  # handed over and re-raised in the consumer's thread
+            put((_DONE, error))
+            return
+        put((_DONE, None))
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if isinstance(item, tuple) and len(item) == 2 and item[0] is _DONE:
+                if item[1] is not None:
+                    raise item[1]
+                return
+            yield item
+    finally:
+        stop.set()
+
+def concurrent_map(function, items, workers=WORKERS, ordered=False):
+    """call function(item) for each item on a pool of worker threads; yield (item, future) pairs
+
+    Items are drawn from the iterable lazily -- it can be a listing still paging -- and at most
+    twice `workers` calls are in flight or finished-but-unconsumed at once, so memory stays
+    bounded however long the input. Pairs come back as calls complete or, with ordered=True, in
+    input order, each released as soon as it and everything before it is done. Call
+    future.result() to get the return value or have the call's exception raised, just as a
+    direct call would, so per-item error handling stays with the caller.
+    """
+    window = max(1, workers) * 2
+    in_flight = deque()
+
+    def finished(block):
+        if ordered:
+            while in_flight and (block or in_flight[0][1].done()):
+                block = False
+                yield in_flight.popleft()
+            return
+        done, _ = wait([future for _, future in in_flight], timeout=None if block else 0,
+                       return_when=FIRST_COMPLETED)
+        for pair in [pair for pair in in_flight if pair[1] in done]:
+            in_flight.remove(pair)
+            yield pair
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        for item in items:
+            in_flight.append((item, pool.submit(function, item)))
+            yield from finished(block=len(in_flight) >= window)
+        while in_flight:
+            yield from finished(block=True)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+class SingleFlightCache:
+    """a bounded LRU of lookup results in which concurrent identical lookups share one request
+
+    get(key, fetch) returns the cached value for key if there is one. Otherwise the first caller
+    runs fetch() while any other thread asking for the same key meanwhile waits for, and shares,
+    that single result instead of issuing a duplicate GET. Successful results are kept (the least
+    recently used dropped past maxsize); an exception is raised to every waiter and not cached,
+    so a failed lookup is retried next time -- have fetch() return a placeholder instead if a
+    failure should stick.
+    """
+
+    def __init__(self, maxsize=LOOKUP_CACHE_SIZE):
+        self._maxsize = maxsize
+        self._results = OrderedDict()
+        self._in_flight = dict()
+        self._lock = threading.Lock()
+
+    def put(self, key, value):
+        """store a value obtained some other way, e.g. from a bulk listing"""
+        with self._lock:
+            self._results[key] = value
+            self._results.move_to_end(key)
+            if len(self._results) > self._maxsize:
+                self._results.popitem(last=False)
+
+    def get(self, key, fetch):
+        """return the value for key, calling fetch() at most once across concurrent callers"""
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+            pending = self._in_flight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._in_flight[key] = Future()
+
+        if not leader:
+            return pending.result()
+
+        try:
+            value = fetch()
+        except BaseException as error:
+            with self._lock:
+                del self._in_flight[key]
+            pending.set_exception(error)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            self._results[key] = value
+            if len(self._results) > self._maxsize:
+                self._results.popitem(last=False)
+        pending.set_result(value)
+        return value
+
+def journal_path(tool):
+    """return a fresh journal filename for a run of the named tool, in the working directory
+
+    Microseconds and the process id keep runs started together (e.g. from a shell loop) apart.
+    """
+    return f'{tool}-{datetime.now().strftime("%Y%m%d-%H%M%S-%f")}-{os.getpid()}.journal'
+
+class OperationJournal:
+    """a write-ahead journal of the mutating operations (adds, deletes) a bulk run will perform
+
+    The journal is a JSON-lines file: a header naming the tool, then every planned operation
+    (a plain dict of whatever the tool needs to repeat it), written and fsync'd before the first
+    one is sent. Each operation that succeeds then gets a completion marker appended, also
+    fsync'd, so however a run ends -- expired token, Ctrl-C, a crash -- re-opening the journal
+    with load() yields exactly the operations still outstanding, with no need to list anything
+    again. Failed operations are recorded too but stay outstanding, so a resume retries them.
+    """
+
+    def __init__(self, path, tool, operations, done):
+        self.path = path
+        self.tool = tool
+        self.operations = operations
+        self.done = done
+        torn = False
+        with open(path, 'rb') as journal_file:
+            if journal_file.seek(0, os.SEEK_END):
+                journal_file.seek(-1, os.SEEK_END)
+                torn = journal_file.read(1) != b'\n'
+        self._file = open(path, 'a', encoding='utf-8')
+        if torn:
+            # a crash mid-write left a partial last line; end it so new markers parse cleanly
+            self._file.write('\n')
+
+    @classmethod
+    def create(cls, path, tool, operations):
+        """write a new journal planning the given operations, and return it open for marking"""
+        with open(path, 'x', encoding='utf-8') as journal_file:
+            journal_file.write(json.dumps({'tool': tool, 'created': datetime.now().isoformat(),
+                                           'operations': len(operations)}) + '\n')
+            for index, operation in enumerate(operations):
+                journal_file.write(json.dumps({'op': index, **operation}) + '\n')
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        return cls(path, tool, list(operations), set())
+
+    @classmethod
+    def load(cls, path, tool):
+        """re-open an existing journal for the named tool; raises ValueError if it isn't one"""
+        operations, done = dict(), set()
+        with open(path, 'r', encoding='utf-8') as journal_file:
+            try:
+                header = json.loads(journal_file.readline())
+            except json.JSONDecodeError as error:
+                raise ValueError(f'{path} is not an operation journal') from error
+            if header.get('tool') != tool:
+                raise ValueError(f'{path} is a journal for {header.get("tool")}, not {tool}')
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a marker torn by a crash mid-write; that operation simply stays outstanding
+                    continue
+                if 'op' in record:
+                    operations[record.pop('op')] = record
+                elif record.get('status') == 'done':
+                    done.add(record['mark'])
+        return cls(path, tool, [operations[index] for index in sorted(operations)], done)
+
+    def pending(self):
+        """return (index, operation) for every operation not yet completed, in planned order"""
+        return [(index, operation) for index, operation in enumerate(self.operations)
+                if index not in self.done]
+
+    def mark(self, index, status, error=None):
+        """durably record the outcome of one operation ('done' or 'failed')"""
+        record = {'mark': index, 'status': status}
+        if error is not None:
+            record['error'] = str(error)
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if status == 'done':
+            self.done.add(index)
+
+    def close(self):
+        """close the journal file"""
+        self._file.close()
+
+def resume_argument(usage):
+    """return the journal path from a '--resume <journal>' command line, or None if not given"""
+    if not sys.argv[1:]:
+        return None
+    if sys.argv[1] != '--resume' or len(sys.argv) != 3:
+        print(usage)
+        sys.exit(1)
+    return sys.argv[2]
+
+def run_journal(journal, perform, report_error, already_done_status=None, report_done=None):
+    """perform every outstanding journal operation in order, marking each as it completes
+
+    perform(operation) makes the operation's API call, and an ApiError from it is sorted out
+    here the same way for every tool. A 401 -- an expired or invalid token, which would fail
+    every remaining operation too -- stops the run so it can be resumed. already_done_status (a
+    status code, or a function of the operation returning one) means the change is already in
+    place, e.g. one that landed just before an interrupted run stopped, so it counts as done
+    (and is passed to report_done(operation, error), if given, to say so). Any other ApiError
+    is passed to report_error(operation, error) and counts as a failure; anything else raised
+    stops the run. Either way the journal is left consistent and the command to pick up where
+    it stopped is printed; once every operation is done the journal is deleted. Returns the
+    failure count.
+    """
+    # imported here, as in webex_api, so the offline tools need not have the SDK installed
+    from webexpythonsdk import ApiError
+
+    pending = journal.pending()
+    failures = 0
+    print(f'# journal: {journal.path} ({len(pending)} of {len(journal.operations)} '
+          'operation(s) outstanding)')
+    try:
+        for index, operation in pending:
+            try:
+                perform(operation)
+            except ApiError as error:
+                if error.status_code == 401:
+                    raise
+                done_status = (already_done_status(operation) if callable(already_done_status)
+                               else already_done_status)
+                if error.status_code != done_status:
+                    report_error(operation, error)
+                    journal.mark(index, 'failed')
+                    failures += 1
+                    continue
+                if report_done:
+                    report_done(operation, error)
+            journal.mark(index, 'done')
+    except (Exception, KeyboardInterrupt):
+        print(f'### Stopped early; continue with: --resume {journal.path} ###')
+        raise
+    finally:
+        journal.close()
+    if failures:
+        print(f'### {failures} operation(s) failed; retry them with: --resume {journal.path} ###')
+    elif not journal.pending():
+        # nothing left to resume
+        os.remove(journal.path)
+    return failures
+
+def list_json(api, resource, **params):
+    """yield the raw JSON items of a paged listing (e.g. 'people', 'rooms'), skipping the SDK's
+    per-item object wrapping
+
+    For tools that keep something from every item of a big listing: pull the few fields needed
+    straight out of each dict into a compact record and let the page go, rather than retaining
+    full SDK objects (which hold the whole payload -- hundreds of MB across 100k people).
+    """
+    return api._session.get_items(resource, params=params)
+
+def list_pages(api, resource, **params):
+    """yield a paged listing one page (a list of raw JSON items) at a time
+
+    For a caller that weighs each further page's call against what it has already found, and
+    stops paging early by simply not asking for the next page.
+    """
+    for page in api._session.get_pages(resource, params=params):
+        yield page.get('items', [])
+
+def parse_record(line):
+    """return the dict on a JSONL input line, or None if the line is a plain value (e.g. an id)"""
+    line = line.strip()
+    if not line.startswith('{'):
+        return None
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return record if isinstance(record, dict) else None
+
+def record_target(record, id_field):
+    """return what a piped JSONL record points a tool at, for tools taking emails and ids
+
+    id_field is the id the tool acts on ('roomId', 'teamId'): a record carrying it -- e.g. a
+    membership, whose personEmail is only who the membership was listed for -- names that
+    space or team. Otherwise a person record names its email, and anything else (a room or
+    team listing entry) its own id.
+    """
+    emails = record.get('emails') or [None]
+    return (record.get(id_field) or record.get('personEmail') or record.get('email') or
+            emails[0] or record.get('id') or '')
+
+def emit_record(record):
+    """write one JSONL record to stdout, flushed so the next tool in a pipe can start on it"""
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+class TokenRefresher:
+    """keeps a WebexAPI session's OAuth access token fresh for the life of a long run
+
+    Refreshable tokens come with the integration's client_id, client_secret and refresh_token in
+    the config's wxteams block (with a suffix such as "_compliance" for a second integration).
+    Before each request the token is refreshed if it is within TOKEN_REFRESH_MARGIN of the expiry
+    recorded in <token>_expires; a request that still comes back 401 triggers one refresh and is
+    retried. Each rotated token is written straight back to the config file so the next run, and
+    any other tool, starts with it. Without the refresh credentials nothing changes: a 401 is
+    raised as before.
+    """
+
+    def __init__(self, config_path, wxteams_config, token_key, suffix):
+        self.config_path = config_path
+        self.token_key = token_key
+        self.expiry_key = f'{token_key}_expires'
+        self.refresh_key = f'refresh_token{suffix}'
+        self.client_id = wxteams_config.get(f'client_id{suffix}')
+        self.client_secret = wxteams_config.get(f'client_secret{suffix}')
+        self.refresh_token = wxteams_config.get(self.refresh_key)
+        self.expires = None
+        expires = wxteams_config.get(self.expiry_key)
+        if expires:
+            # YAML may already have parsed the timestamp; either way normalize to an aware UTC time
+            try:
+                self.expires = datetime.fromisoformat(str(expires))
+            except ValueError:
+                pass
+            if self.expires and self.expires.tzinfo is None:
+                self.expires = self.expires.replace(tzinfo=timezone.utc)
+        self._lock = threading.Lock()
+
+    @property
+    def can_refresh(self):
+        """True if the config holds everything needed to refresh the token"""
+        return bool(self.client_id and self.client_secret and self.refresh_token)
+
+    def due(self):
+        """True if the token is known to be expiring within the refresh margin"""
+        return bool(self.expires and
+                    datetime.now(timezone.utc) + TOKEN_REFRESH_MARGIN >= self.expires)
+
+    def refresh(self, api, stale_token):
+        """swap a fresh access token into the api session, unless another thread already has"""
+        with self._lock:
+            if api.access_token != stale_token:
+                return
+            tokens = api.access_tokens.refresh(client_id=self.client_id,
+                                               client_secret=self.client_secret,
+                                               refresh_token=self.refresh_token)
+            api._session._access_token = tokens.access_token
+            api._session.update_headers({'Authorization': 'Bearer ' + tokens.access_token})
+            self.expires = (datetime.now(timezone.utc) + timedelta(seconds=tokens.expires_in)
+                            if tokens.expires_in else None)
+            self.refresh_token = tokens.refresh_token or self.refresh_token
+            self.save(tokens.access_token)
+
+    def save(self, access_token):
+        """write the rotated token, its expiry and refresh token back to the config file
+
+        Only those keys' lines within the wxteams block are rewritten (an expiry line is added
+        under the token if there isn't one yet, or dropped if the new token came without an
+        expiry), so the rest of the file -- comments and other blocks included -- is left
+        untouched. Refreshers sharing the file take turns, so neither loses the other's token.
+        """
+        with _CONFIG_LOCK:
+            with open(self.config_path, 'r', encoding='utf-8') as config_file:
+                contents = config_file.read()
+            # the wxteams: line and every indented, blank or comment line after it
+            block = re.search(r'^wxteams:[^\n]*(?:\n(?:[ \t]+[^\n]*|[ \t]*(?:#[^\n]*)?)(?=\n|$))*',
+                              contents, re.MULTILINE)
+            if not block:
+                print(f'### No wxteams block found in {self.config_path}; '
+                      'the refreshed token was not saved ###', file=sys.stderr)
+                return
+            section = block.group(0)
+            values = {self.token_key: access_token, self.refresh_key: self.refresh_token}
+            if self.expires:
+                values[self.expiry_key] = self.expires.isoformat(timespec='seconds')
+            else:
+                section = re.sub(rf'\n[ \t]*{re.escape(self.expiry_key)}:[^\n]*', '', section)
+            for key, value in values.items():
+                line = re.compile(rf'^([ \t]*){re.escape(key)}:[^\n]*$', re.MULTILINE)
+                if line.search(section):
+                    section = line.sub(lambda match: f'{match.group(1)}{key}: {value}', section,
+                                       count=1)
+                else:
+                    token_line = re.compile(rf'^([ \t]*){re.escape(self.token_key)}:[^\n]*$',
+                                            re.MULTILINE)
+                    section = token_line.sub(
+                        lambda match: f'{match.group(0)}\n{match.group(1)}{key}: {value}',
+                        section, count=1)
+            contents = contents[:block.start()] + section + contents[block.end():]
+            temp_path = self.config_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as config_file:
+                config_file.write(contents)
+            os.replace(temp_path, self.config_path)
+
+def webex_api(config_path, wxteams_config, token_key='auth_token', **kwargs):
+    """return a WebexAPI for the given config token that refreshes it in-process when it can
+
+    token_key picks the token ('auth_token', or 'auth_token_compliance' for the Compliance
+    Officer integration, whose refresh credentials carry the same suffix); any other keyword
+    arguments are passed to WebexAPI.
+    """
+    # imported here so the offline tools (wxtm_uclogin_decoder.py) can use this module without
+    # the SDK installed
+    from webexpythonsdk import ApiError, WebexAPI
+
+    api = WebexAPI(access_token=wxteams_config[token_key], **kwargs)
+    refresher = TokenRefresher(config_path, wxteams_config, token_key,
+                               token_key[len('auth_token'):])
+    if not refresher.can_refresh:
+        return api
+
+    # every SDK call -- single GETs, each page of a listing, creates and deletes -- funnels
+    # through the session's request(), so wrapping that one method covers them all
+    session = api._session
+    send = session.request
+
+    def request(method, url, erc, **request_kwargs):
+        if refresher.due():
+            refresher.refresh(api, api.access_token)
+        token = api.access_token
+        try:
+            return send(method, url, erc, **request_kwargs)
+        except ApiError as error:
+            if error.status_code != 401:
+                raise
+            refresher.refresh(api, token)
+            return send(method, url, erc, **request_kwargs)
+
+    session.request = request
+    return api
+
+def run_main(main):
+    """run a script's main(), under cProfile if --profile is among its arguments
+
+    --profile is taken out of sys.argv before main() parses it. The profile is written to
+    <tool>-<timestamp>.pstats in the working directory -- load it with pstats, or render it as a
+    flamegraph/icicle chart with e.g. snakeviz or flameprof -- and the PROFILE_TOP functions by
+    self time are printed to stderr, however the run ends. Only the main thread is profiled;
+    background paging and worker threads show up as time spent waiting on them.
+    """
+    if '--profile' not in sys.argv[1:]:
+        return main()
+    sys.argv.remove('--profile')
+    tool = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    path = f'{tool}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.pstats'
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(main)
+    finally:
+        profiler.dump_stats(path)
+        print(f'\n# profile written to {path}; top {PROFILE_TOP} functions by self time:',
+              file=sys.stderr)
+        pstats.Stats(path, stream=sys.stderr).sort_stats('tottime').print_stats(PROFILE_TOP)
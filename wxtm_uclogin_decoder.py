@@ -25,6 +25,8 @@ import glob
 import os
 import sys
 
+from wxcommon import run_main
+
 OUT_FOLDER = 'decoded'
 CED_FILE = 'ced.dat'
 FILESPEC = 'uclogin.log*'
@@ -69,4 +71,4 @@ def main():
             counter += 1
 
 if __name__ == "__main__":
-    main()
+    run_main(main)